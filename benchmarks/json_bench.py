@@ -0,0 +1,96 @@
+"""
+Measures /gt_logs serialization throughput for the available JSON encoders.
+
+Encodes synthetic log pages the way get_events does (a list of
+serialize_log dicts with datetime timestamps) with Flask's stdlib provider
+and with FastJSONProvider:
+
+    python -m benchmarks.json_bench --rows 10000 100000
+"""
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from datetime import datetime, timedelta
+import argparse
+import json
+import sys
+import time
+
+import json_provider
+from json_provider import FastJSONProvider
+
+
+def make_rows(count):
+    start = datetime(2024, 1, 8, 8, 0, 0)
+    return [
+        {
+            "tag": f"{i:08X}" if i % 10 else None,
+            "Name": f"Student {i % 5000}" if i % 10 else "Unknown",
+            "Matric": f"MAT{i % 5000:06d}",
+            "timestamp": start + timedelta(seconds=i * 3, microseconds=i % 1000),
+        }
+        for i in range(count)
+    ]
+
+
+class StdlibProvider(FastJSONProvider):
+    """FastJSONProvider with orjson disabled, i.e. the stdlib fallback."""
+
+    def dumps(self, obj, **kwargs):
+        saved, json_provider.orjson = json_provider.orjson, None
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            json_provider.orjson = saved
+
+
+def bench(provider, rows, repeat):
+    """Returns the best of `repeat` runs as rows/s and MB/s."""
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        began = time.perf_counter()
+        size = len(provider.dumps({"logs": rows, "next": None}).encode("utf-8"))
+        best = min(best, time.perf_counter() - began)
+    return {
+        "seconds": best,
+        "rows_per_second": len(rows) / best,
+        "megabytes_per_second": size / best / 1e6,
+        "bytes": size,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    app = Flask(__name__)
+    providers = {
+        "flask_default": DefaultJSONProvider(app),
+        "stdlib_fallback": StdlibProvider(app),
+    }
+    if json_provider.orjson is not None:
+        providers["orjson"] = FastJSONProvider(app)
+
+    results = {}
+    for count in args.rows:
+        rows = make_rows(count)
+        # Flask's own provider writes datetimes as HTTP dates, so give it strings
+        formatted = [dict(row, timestamp=row["timestamp"].isoformat() + "Z") for row in rows]
+        results[str(count)] = {
+            name: bench(provider, formatted if name == "flask_default" else rows, args.repeat)
+            for name, provider in providers.items()
+        }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
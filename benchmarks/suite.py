@@ -0,0 +1,216 @@
+"""
+Load-tests POST /log and GET /gt_logs and records the results as JSON.
+
+Runs the Flask app in-process against a local MongoDB stand-in: a real
+mongod when one answers at --mongo-url (default mongodb://localhost:27017,
+database rfid_bench, which is dropped and re-seeded), otherwise mongomock.
+Each workload is driven from --concurrency threads and reports p50/p95/p99
+latency, throughput and process memory:
+
+    python -m benchmarks.suite --requests 5000 --concurrency 16
+    python -m benchmarks.suite --baseline benchmarks/results/previous.json
+    python -m benchmarks.suite --workload log --write-profile fast --write-profile durable
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from generate_data import generate
+from write_profiles import WRITE_PROFILES
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a sorted list of samples."""
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def connect(mongo_url, backend):
+    """Returns (backend name, database) for the requested stand-in."""
+    if backend in ("auto", "mongod"):
+        from pymongo import MongoClient
+        from pymongo.errors import PyMongoError
+        client = MongoClient(mongo_url, serverSelectionTimeoutMS=500)
+        try:
+            client.admin.command("ping")
+            client.drop_database("rfid_bench")
+            return "mongod", client["rfid_bench"]
+        except PyMongoError:
+            if backend == "mongod":
+                raise
+    import mongomock
+    return "mongomock", mongomock.MongoClient()["rfid_bench"]
+
+
+def load_app(db, backend, dedup_window):
+    """Imports main with settings suited to benchmarking; returns it and an app using `db`."""
+    if backend == "mongomock":
+        # mongomock's bulk_write can't build pymongo 4.11 UpdateOne requests
+        os.environ["ROLLUPS_ENABLED"] = "0"
+    scratch = tempfile.mkdtemp(prefix="rfid-bench-")
+    os.environ["USER_CACHE_WATCH"] = "0"
+    os.environ["JOURNAL_DIR"] = os.path.join(scratch, "journal")
+    os.environ["EXPORT_DIR"] = os.path.join(scratch, "exports")
+    os.environ["DEDUP_WINDOW"] = str(dedup_window)
+    import main
+    return main, main.create_app(db)
+
+
+def run_workload(app, requests, concurrency, make_request):
+    """Issues `requests` calls of make_request(client, i) and summarises them."""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        began = time.perf_counter()
+        response = make_request(local.client, i)
+        elapsed = (time.perf_counter() - began) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(requests)))
+    wall = time.perf_counter() - began
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": requests / wall,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1],
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def workloads(population, unknown_share, rng):
+    """The request mixes to measure, keyed by name."""
+    matrics = [rng.choice(population)["Matric"] if rng.random() >= unknown_share else f"UNKNOWN{i}" for i in range(10000)]
+    tags = [rng.choice(population)["tag"] for _ in range(10000)]
+    return {
+        "log": lambda client, i: client.post("/log", json={"matric": matrics[i % len(matrics)], "status": "in", "reader": f"r{i % 8}"}),
+        "log_by_tag": lambda client, i: client.post("/log", json={"tag": tags[i % len(tags)], "reader": f"r{i % 8}"}),
+        "gt_logs_page": lambda client, i: client.get("/gt_logs?limit=50"),
+        "gt_logs_page_fields": lambda client, i: client.get("/gt_logs?limit=200&fields=Matric,timestamp"),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Prints the relative change of key metrics against a previous run."""
+    for name, current in results["workloads"].items():
+        previous = baseline.get("workloads", {}).get(name)
+        if not previous:
+            continue
+        changes = ", ".join(
+            f"{metric} {(current[metric] - previous[metric]) / previous[metric] * 100:+.1f}%"
+            for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms") if previous.get(metric)
+        )
+        print(f"{name}: {changes}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", choices=("auto", "mongod", "mongomock"), default="auto")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--logs", type=int, default=50000, help="existing Data documents to seed")
+    parser.add_argument("--days", type=int, default=7, help="days of history the seeded logs span")
+    parser.add_argument("--unknown-share", type=float, default=0.05)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--dedup-window", type=float, default=0, help="DEDUP_WINDOW for the app under test")
+    parser.add_argument("--workload", action="append", help="run only these workloads")
+    parser.add_argument("--write-profile", action="append", choices=sorted(WRITE_PROFILES),
+                        help="also run /log with inserts inline under this write profile (repeatable)")
+    parser.add_argument("--tracemalloc", action="store_true", help="also record Python heap peaks (slows requests)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<time>-<backend>.json)")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    backend, db = connect(args.mongo_url, args.backend)
+    population = generate(db, args.users, args.logs, days=args.days, unknown_share=args.unknown_share,
+                          seed=args.seed, meta=False, report=lambda message: None)
+    app_module, app = load_app(db, backend, args.dedup_window)
+
+    selected = workloads(population, args.unknown_share, rng)
+    if args.workload:
+        selected = {name: selected[name] for name in args.workload}
+    # (LOG_WRITE_PROFILE, LOG_WRITER_ASYNC) per workload; None keeps the app's settings
+    settings = dict.fromkeys(selected)
+    for profile in args.write_profile or ():
+        selected[f"log_write_{profile}"] = selected.get("log") or workloads(population, args.unknown_share, rng)["log"]
+        # Writing inline puts the insert, and so its acknowledgement wait, in the request
+        settings[f"log_write_{profile}"] = (profile, False)
+
+    results = {
+        "started": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "backend": backend,
+        "parameters": vars(args),
+        "workloads": {},
+    }
+    defaults = (app_module.LOG_WRITE_PROFILE, app_module.LOG_WRITER_ASYNC)
+    for name, make_request in selected.items():
+        app_module.LOG_WRITE_PROFILE, app_module.LOG_WRITER_ASYNC = settings[name] or defaults
+        if args.tracemalloc:
+            tracemalloc.start()
+        summary = run_workload(app, args.requests, args.concurrency, make_request)
+        if args.tracemalloc:
+            summary["heap_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        summary["max_rss_bytes"] = maxrss if sys.platform == "darwin" else maxrss * 1024
+        results["workloads"][name] = summary
+        print(f"{name}: {summary['throughput_rps']:.0f} req/s, p50 {summary['p50_ms']:.2f} ms, "
+              f"p95 {summary['p95_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms")
+
+    app_module.log_writer.close()
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{backend}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Compares the plain and time-series layouts of the access logs.
+
+Reports storage size from collStats and the latency of /gt_logs pages
+against both collections, issued the way the app issues them: the newest
+pages in the order the layout pages on (_id for the plain layout, timestamp
+for time series), and pages through random timestamp ranges, keyset-paginated
+on (timestamp, _id). Run it e.g. after `timeseries.py migrate`:
+
+    python -m benchmarks.timeseries_bench --regular Data_legacy --timeseries Data
+"""
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from dotenv import load_dotenv
+from datetime import timedelta
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from main import DEFAULT_LOG_FIELDS, ID_SORT, TIMESTAMP_SORT, encode_page_cursor, page_after, page_projection
+
+# Sort of unranged /gt_logs pages per layout (see main.page_sort)
+LATEST_SORTS = {"regular": ID_SORT, "timeseries": TIMESTAMP_SORT}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def storage_stats(db, name):
+    stats = db.command("collStats", name)
+    return {
+        "count": stats.get("count"),
+        "size": stats.get("size"),
+        "storage_size": stats.get("storageSize"),
+        "index_size": stats.get("totalIndexSize"),
+    }
+
+
+def latency_summary(latencies):
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 95),
+        "max_ms": max(latencies),
+    }
+
+
+def page_latencies(collection, query, sort, pages, page_size):
+    """Walks up to `pages` /gt_logs pages over `query` in `sort` order; returns each page's latency in ms."""
+    projection = page_projection(DEFAULT_LOG_FIELDS, sort)
+    latencies = []
+    after = {}
+    for _ in range(pages):
+        began = time.perf_counter()
+        # One extra document, as the app fetches to tell whether another page exists
+        logs = list(collection.find(dict(query, **after), projection).sort(sort).limit(page_size + 1))
+        latencies.append((time.perf_counter() - began) * 1000)
+        if len(logs) <= page_size:
+            break
+        after = page_after(encode_page_cursor(logs[page_size - 1], sort), sort)
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--regular", default="Data_legacy")
+    parser.add_argument("--timeseries", default="Data")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--window-hours", type=float, default=24)
+    parser.add_argument("--pages", type=int, default=5, help="pages walked per query")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = MongoClient(os.environ["DATABASE_URL"]).get_database()
+    regular = db[args.regular]
+
+    first = regular.find_one({}, sort=[("timestamp", ASCENDING)])
+    last = regular.find_one({}, sort=[("timestamp", DESCENDING)])
+    if not first:
+        print(f"{args.regular} is empty", file=sys.stderr)
+        return 1
+
+    # Same random windows for both layouts so the comparison is fair
+    rng = random.Random(args.seed)
+    window = timedelta(hours=args.window_hours)
+    span = max((last["timestamp"] - first["timestamp"] - window).total_seconds(), 0)
+    windows = []
+    for _ in range(args.queries):
+        start = first["timestamp"] + timedelta(seconds=rng.uniform(0, span))
+        windows.append((start, start + window))
+
+    results = {}
+    for label, name in (("regular", args.regular), ("timeseries", args.timeseries)):
+        latest = []
+        ranged = []
+        for start, end in windows:
+            latest.extend(page_latencies(db[name], {}, LATEST_SORTS[label], args.pages, args.page_size))
+            query = {"timestamp": {"$gte": start, "$lt": end}}
+            ranged.extend(page_latencies(db[name], query, TIMESTAMP_SORT, args.pages, args.page_size))
+        results[label] = {
+            "collection": name,
+            "storage": storage_stats(db, name),
+            "latest_pages": latency_summary(latest),
+            "range_pages": latency_summary(ranged),
+        }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Compares gunicorn worker classes on the POST /log workload.
+
+Starts the app under gunicorn.conf.py once per worker class against a real
+MongoDB (--mongo-url, whose database is dropped and re-seeded) and drives it
+over HTTP with keep-alive connections from --concurrency client threads:
+
+    python -m benchmarks.workers_bench --classes sync gthread gevent --concurrency 64
+
+The client is Python too, so past a few thousand requests per second it
+becomes the bottleneck; compare latency percentiles as well as throughput.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from pymongo import MongoClient
+
+from benchmarks.suite import RESULTS_DIR, git_revision, percentile
+from generate_data import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(worker_class, workers, port, mongo_url, scratch):
+    """Starts gunicorn with the repo's config; returns the process once it answers."""
+    env = dict(
+        os.environ,
+        DATABASE_URL=mongo_url,
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        USER_CACHE_WATCH="0",
+        DEDUP_WINDOW="0",
+        JOURNAL_DIR=os.path.join(scratch, worker_class, "journal"),
+        EXPORT_DIR=os.path.join(scratch, worker_class, "exports"),
+    )
+    # gunicorn logs to a file, since an unread pipe would eventually block it
+    log_path = os.path.join(scratch, f"{worker_class}.log")
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn ({worker_class}) exited, see {log_path}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/metrics")
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"gunicorn ({worker_class}) didn't start listening on port {port}")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def drive(port, bodies, concurrency):
+    """POSTs every body to /log over `concurrency` keep-alive connections."""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def call(body):
+        if not hasattr(local, "connection"):
+            local.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        began = time.perf_counter()
+        local.connection.request("POST", "/log", body, {"Content-Type": "application/json"})
+        response = local.connection.getresponse()
+        response.read()
+        elapsed = (time.perf_counter() - began) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, bodies))
+    wall = time.perf_counter() - began
+
+    latencies.sort()
+    return {
+        "requests": len(bodies),
+        "concurrency": concurrency,
+        "throughput_rps": len(bodies) / wall,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1],
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--classes", nargs="+", default=["sync", "gthread", "gevent"],
+                        choices=("sync", "gthread", "gevent", "eventlet"))
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers per run")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/rfid_bench")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--unknown-share", type=float, default=0.05)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<time>-workers.json)")
+    args = parser.parse_args(argv)
+
+    db = MongoClient(args.mongo_url).get_database()
+    db.client.drop_database(db.name)
+    population = generate(db, args.users, 0, seed=args.seed, report=lambda message: None)
+
+    rng = random.Random(args.seed)
+    bodies = [
+        json.dumps({
+            "matric": rng.choice(population)["Matric"] if rng.random() >= args.unknown_share else f"UNKNOWN{i}",
+            "status": "in",
+            "reader": f"r{i % 8}",
+        })
+        for i in range(args.requests)
+    ]
+
+    results = {
+        "started": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "workloads": {},
+    }
+    scratch = tempfile.mkdtemp(prefix="rfid-workers-bench-")
+    for worker_class in args.classes:
+        process = start_server(worker_class, args.workers, args.port, args.mongo_url, scratch)
+        try:
+            drive(args.port, bodies[:args.concurrency], args.concurrency)  # warm up connections and caches
+            summary = drive(args.port, bodies, args.concurrency)
+        finally:
+            stop_server(process)
+        results["workloads"][f"log_{worker_class}"] = summary
+        print(f"{worker_class}: {summary['throughput_rps']:.0f} req/s, p50 {summary['p50_ms']:.2f} ms, "
+              f"p95 {summary['p95_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms")
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-workers.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
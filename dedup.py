@@ -0,0 +1,101 @@
+from datetime import timedelta
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ScanDebouncer:
+    """
+    Collapses repeated reports of one tap into a single log entry.
+
+    Entries are held in buckets of `window` seconds keyed by (card, reader).
+    A report that arrives within `window` seconds of the first one for the
+    same key just bumps that entry's `repeat_count`. Once a bucket can no
+    longer receive repeats (two windows later) its entries are handed to
+    `emit`, so each held entry is written at most ~2 windows after the tap.
+    """
+
+    def __init__(self, window, emit):
+        self.window = window
+        self.emit = emit
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def offer(self, key, entry, now=None):
+        """
+        Returns True if `entry` repeats a held one (and was folded into it),
+        False if it was held as a new entry.
+        """
+        now = time.monotonic() if now is None else now
+        bucket = int(now // self.window)
+        self._ensure_started()
+        with self._lock:
+            for index in (bucket, bucket - 1):
+                held = self._buckets.get(index, {}).get(key)
+                if held is not None and now - held[0] <= self.window:
+                    held[1]["repeat_count"] += 1
+                    return True
+            entry["repeat_count"] = 1
+            self._buckets.setdefault(bucket, {})[key] = (now, entry)
+            return False
+
+    def _expired(self, now, everything=False):
+        oldest_live = int(now // self.window) - 1
+        with self._lock:
+            expired = [index for index in self._buckets if everything or index < oldest_live]
+            return [entry for index in expired for _, entry in self._buckets.pop(index).values()]
+
+    def flush(self, now=None, everything=False):
+        """Emits every held entry whose window has closed (or all of them)."""
+        entries = self._expired(time.monotonic() if now is None else now, everything)
+        for entry in entries:
+            try:
+                self.emit(entry)
+            except Exception:
+                logger.exception("Failed to emit debounced scan")
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so a forked worker starts its own
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._stop.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="scan-debouncer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.window / 2):
+            self.flush()
+
+    def close(self):
+        """Stops the sweeper and emits everything still held."""
+        self._stop.set()
+        self.flush(everything=True)
+
+
+def collapse_repeats(entries, window, key):
+    """
+    Folds repeats inside an uploaded batch, using the scans' own timestamps.
+
+    Returns the entries that were kept, each with a `repeat_count`.
+    """
+    window = timedelta(seconds=window)
+    kept = []
+    first_seen = {}
+    for entry in entries:
+        held = first_seen.get(key(entry))
+        if held is not None and abs(entry["timestamp"] - held["timestamp"]) <= window:
+            held["repeat_count"] += 1
+            continue
+        entry["repeat_count"] = 1
+        first_seen[key(entry)] = entry
+        kept.append(entry)
+    return kept
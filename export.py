@@ -0,0 +1,180 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import csv
+import io
+import json
+import logging
+import os
+import re
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def csv_value(value):
+    """Renders a log field for CSV; dates as ISO 8601 UTC, missing values empty."""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat() + "Z"
+    return value
+
+
+def iter_csv(logs, fields, chunk_rows=500):
+    """Yields CSV text for a cursor of log documents, a chunk of rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    rows = 0
+    for log in logs:
+        writer.writerow([csv_value(log.get(field)) for field in fields])
+        rows += 1
+        if rows % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def arrow_schema(fields):
+    """Arrow schema for the exported log fields; timestamp is a UTC date column."""
+    return pa.schema([
+        (field, pa.timestamp("ms", tz="UTC") if field == "timestamp" else pa.string())
+        for field in fields
+    ])
+
+
+def _arrow_value(field, value):
+    if field == "timestamp":
+        # Unmigrated string timestamps can't go in a date column
+        return value if isinstance(value, datetime) else None
+    return None if value is None else str(value)
+
+
+def iter_record_batches(logs, fields, batch_rows):
+    """Converts a cursor of log documents into Arrow record batches of `batch_rows`."""
+    schema = arrow_schema(fields)
+    columns = {field: [] for field in fields}
+    count = 0
+    for log in logs:
+        for field in fields:
+            columns[field].append(_arrow_value(field, log.get(field)))
+        count += 1
+        if count == batch_rows:
+            yield pa.RecordBatch.from_pydict(columns, schema=schema)
+            columns = {field: [] for field in fields}
+            count = 0
+    if count:
+        yield pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def write_export(logs, fields, fmt, path, batch_rows=10000):
+    """Writes a cursor of log documents to `path` in the given format; returns the row count."""
+    rows = 0
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for log in logs:
+                writer.writerow([csv_value(log.get(field)) for field in fields])
+                rows += 1
+        return rows
+
+    schema = arrow_schema(fields)
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(path, schema)
+    else:
+        writer = pa.ipc.new_file(path, schema)
+    with writer:
+        for batch in iter_record_batches(logs, fields, batch_rows):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+class ExportJobs:
+    """
+    Runs exports in the background and writes them to `directory`.
+
+    Each job's state is kept in a `<id>.json` file next to its output, so
+    any worker process can report on or serve a job another one started.
+    """
+
+    def __init__(self, directory, max_workers=2, batch_rows=10000):
+        self.directory = directory
+        self.batch_rows = batch_rows
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+
+    def _state_path(self, job_id):
+        return os.path.join(self.directory, job_id + ".json")
+
+    def _save(self, state):
+        path = self._state_path(state["id"])
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    def get(self, job_id):
+        """Returns a job's state, or None for an unknown or malformed id."""
+        if not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(self._state_path(job_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def output_path(self, state):
+        return os.path.join(self.directory, state["id"] + EXPORT_FORMATS[state["format"]])
+
+    def submit(self, open_cursor, fields, fmt, filters):
+        """
+        Queues an export. `open_cursor` is called on the worker thread to
+        get the Data cursor, so no database work happens on the request.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        state = {
+            "id": uuid.uuid4().hex,
+            "format": fmt,
+            "fields": list(fields),
+            "filters": filters,
+            "state": "queued",
+            "rows": None,
+            "error": None,
+            "created": datetime.utcnow().isoformat() + "Z",
+        }
+        self._save(state)
+        # The worker gets its own copy so the returned state isn't mutated under us
+        self._pool.submit(self._run, dict(state), open_cursor)
+        return state
+
+    def _run(self, state, open_cursor):
+        state["state"] = "running"
+        self._save(state)
+        path = self.output_path(state)
+        try:
+            state["rows"] = write_export(open_cursor(), state["fields"], state["format"], path + ".tmp", self.batch_rows)
+            os.replace(path + ".tmp", path)
+            state["state"] = "done"
+        except Exception as exc:
+            logger.exception("Export %s failed", state["id"])
+            state["state"] = "failed"
+            state["error"] = str(exc)
+        state["finished"] = datetime.utcnow().isoformat() + "Z"
+        self._save(state)
@@ -0,0 +1,180 @@
+from pymongo import MongoClient
+from dotenv import load_dotenv
+from bson import ObjectId
+from indexes import ensure_indexes
+from timeseries import is_timeseries, log_meta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import accumulate
+import argparse
+import os
+import random
+import sys
+
+FIRST_NAMES = (
+    "Adaeze", "Ayomide", "Chinedu", "Damilola", "Emeka", "Funmilayo", "Ibrahim", "Ifeoma",
+    "Kelechi", "Kemi", "Musa", "Ngozi", "Oluwaseun", "Segun", "Temitope", "Tunde",
+    "Uche", "Yetunde", "Zainab", "Bola",
+)
+LAST_NAMES = (
+    "Abubakar", "Adebayo", "Adeyemi", "Bello", "Chukwu", "Eze", "Ibekwe", "Kadeba",
+    "Lawal", "Nwosu", "Obi", "Okafor", "Okonkwo", "Olawale", "Onyeka", "Salami",
+    "Usman", "Yusuf",
+)
+
+# Most scans happen in the minutes around a class change, on the hour
+CLASS_CHANGE_HOURS = range(8, 18)
+BURST_SHARE = 0.7
+BURST_SPREAD_MINUTES = 4
+# The rest are spread over the hours the gates are open
+OPEN_HOURS = (7, 22)
+WEEKEND_WEIGHT = 0.15
+
+# Scans are generated and inserted in chunks of this many documents; chunk
+# n always gets the same random stream, so output doesn't depend on --workers
+CHUNK_SIZE = 10000
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def make_users(count, seed):
+    """Returns `count` Users documents, the same ones for the same seed."""
+    rng = random.Random(f"{seed}-users")
+    users = []
+    tags = set()
+    for i in range(count):
+        # Card UIDs are random 4-byte values, unique across the population
+        tag = f"{rng.getrandbits(32):08X}"
+        while tag in tags:
+            tag = f"{rng.getrandbits(32):08X}"
+        tags.add(tag)
+        users.append({
+            "tag": tag,
+            "Name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "Matric": f"MAT{i:06d}",
+        })
+    return users
+
+
+def make_unknown_tags(users, seed):
+    """A small pool of unregistered cards, so unknown scans repeat like real ones."""
+    rng = random.Random(f"{seed}-unknown")
+    known = {user["tag"] for user in users}
+    tags = []
+    while len(tags) < max(1, len(users) // 50):
+        tag = f"{rng.getrandbits(32):08X}"
+        if tag not in known:
+            tags.append(tag)
+    return tags
+
+
+def _scan_time(rng, start, days, day_weights):
+    day = rng.choices(range(days), cum_weights=day_weights)[0]
+    midnight = start + timedelta(days=day)
+    if rng.random() < BURST_SHARE:
+        offset = rng.choice(CLASS_CHANGE_HOURS) * 3600 + rng.gauss(0, BURST_SPREAD_MINUTES * 60)
+    else:
+        offset = rng.uniform(OPEN_HOURS[0] * 3600, OPEN_HOURS[1] * 3600)
+    return midnight + timedelta(seconds=offset)
+
+
+def make_scans(chunk, count, users, unknown_tags, seed, start, days, unknown_share=0.03, readers=0, meta=False):
+    """
+    Returns chunk number `chunk` of Data documents: `count` scans shaped
+    like the ones /log writes, with _ids that sort in timestamp order.
+    """
+    rng = random.Random(f"{seed}-scans-{chunk}")
+    day_weights = list(accumulate(
+        WEEKEND_WEIGHT if (start + timedelta(days=day)).weekday() >= 5 else 1.0 for day in range(days)
+    ))
+
+    scans = []
+    for _ in range(count):
+        timestamp = _scan_time(rng, start, days, day_weights)
+        timestamp = timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+        if rng.random() < unknown_share:
+            scan = {"tag": rng.choice(unknown_tags), "Name": "Unknown", "Matric": None}
+        else:
+            user = rng.choice(users)
+            scan = {"tag": user["tag"], "Name": user["Name"], "Matric": user["Matric"]}
+        scan["Status"] = "in" if rng.random() < 0.5 else "out"
+        scan["timestamp"] = timestamp
+        if readers:
+            scan["reader"] = f"reader-{rng.randrange(readers)}"
+        if meta:
+            scan["meta"] = log_meta(scan)
+        # Time-ordered _ids, as if each scan had been inserted when it happened
+        scan["_id"] = ObjectId(int((timestamp - EPOCH).total_seconds()).to_bytes(4, "big") + rng.getrandbits(64).to_bytes(8, "big"))
+        scans.append(scan)
+    return scans
+
+
+def generate(db, users=50000, scans=2000000, days=30, start=None, unknown_share=0.03, readers=0,
+             seed=1, workers=4, drop=False, meta=None, report=print):
+    """
+    Loads a synthetic campus into Users and Data, in parallel bulk inserts.
+
+    The same seed and start date always produce the same documents (_ids
+    included). Indexes are created after the load, which is much faster
+    than maintaining them insert by insert. `meta` adds the time-series
+    metaField; None detects it from Data. Returns the Users documents.
+    """
+    if start is None:
+        start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    if drop:
+        db["Users"].drop()
+        # Keep a time-series Data collection's options; plain ones are quicker to drop
+        if is_timeseries(db):
+            db["Data"].delete_many({})
+        else:
+            db["Data"].drop()
+
+    population = make_users(users, seed)
+    for offset in range(0, users, CHUNK_SIZE):
+        db["Users"].insert_many([dict(user) for user in population[offset:offset + CHUNK_SIZE]], ordered=False)
+    unknown_tags = make_unknown_tags(population, seed)
+    report(f"Inserted {users} users")
+
+    if meta is None:
+        meta = is_timeseries(db)
+    chunks = [(chunk, min(CHUNK_SIZE, scans - chunk * CHUNK_SIZE)) for chunk in range(-(-scans // CHUNK_SIZE))]
+
+    def load(chunk):
+        documents = make_scans(chunk[0], chunk[1], population, unknown_tags, seed, start, days, unknown_share, readers, meta)
+        db["Data"].insert_many(documents, ordered=False)
+        return len(documents)
+
+    inserted = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for count in pool.map(load, chunks):
+            inserted += count
+            if inserted % (CHUNK_SIZE * 50) < CHUNK_SIZE:
+                report(f"Inserted {inserted} of {scans} scans")
+    report(f"Inserted {inserted} scans over {days} days from {start.date()}")
+
+    ensure_indexes(db)
+    return population
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load synthetic Users and Data for load testing.")
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--scans", type=int, default=2000000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--start", type=datetime.fromisoformat, help="first day (UTC); defaults to --days ago")
+    parser.add_argument("--unknown-share", type=float, default=0.03, help="fraction of scans from unregistered cards")
+    parser.add_argument("--readers", type=int, default=0, help="spread scans over this many readers (0: no reader field)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--drop", action="store_true", help="empty Users and Data first")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = MongoClient(os.environ["DATABASE_URL"]).get_database()
+    generate(db, args.users, args.scans, args.days, args.start, args.unknown_share, args.readers,
+             args.seed, args.workers, args.drop)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
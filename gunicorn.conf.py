@@ -0,0 +1,98 @@
+"""
+Production server settings:
+
+    gunicorn -c gunicorn.conf.py
+
+GUNICORN_WORKER_CLASS picks the worker: gevent (the default), eventlet,
+gthread or sync. gevent and eventlet serve many concurrent scans and
+dashboard sockets per worker on cooperative I/O; pymongo supports gevent.
+`kill -HUP <master>` reloads gracefully: new workers start, and old ones
+finish in-flight requests and flush buffered logs before exiting.
+
+One worker is the default, since that is all Socket.IO supports as is: a
+long-polling session lives in the worker that handled its handshake, and
+its next request is rejected if it lands on another worker. More workers
+(GUNICORN_WORKERS) need a proxy with sticky sessions (e.g. nginx ip_hash)
+or dashboards that connect with the websocket transport only, plus
+SOCKETIO_MESSAGE_QUEUE (e.g. redis://...) so scans handled by one worker
+reach dashboards connected to the others. Each worker also keeps its own
+user cache and metrics, and with DEDUP_WINDOW set only collapses the
+repeats it receives itself.
+"""
+import os
+
+WORKER_CLASSES = {
+    # gevent-websocket's worker also upgrades Socket.IO connections
+    "gevent": "geventwebsocket.gunicorn.workers.GeventWebSocketWorker",
+    "eventlet": "eventlet",
+    "gthread": "gthread",
+    "sync": "sync",
+}
+# Flask-SocketIO picks eventlet whenever it is installed unless told otherwise
+SOCKETIO_ASYNC_MODES = {"gevent": "gevent", "eventlet": "eventlet", "gthread": "threading", "sync": "threading"}
+
+worker_kind = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+if worker_kind not in WORKER_CLASSES:
+    raise ValueError(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}")
+
+# Patch before anything imports pymongo or starts a thread. The workers
+# would patch after fork anyway, but a preloaded app must already see the
+# cooperative socket and threading modules, or pymongo's pool and monitor
+# threads block the whole worker.
+if worker_kind == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+elif worker_kind == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+
+from dotenv import load_dotenv  # noqa: E402
+
+# The other GUNICORN_* settings may come from .env like the app's own;
+# GUNICORN_WORKER_CLASS has to be in the environment, as it decides the
+# patching above
+load_dotenv()
+
+wsgi_app = "main:create_app()"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = WORKER_CLASSES[worker_kind]
+# Concurrency comes from the worker class (see the docstring before raising this)
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "8")) if worker_kind == "gthread" else 1
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+# Each concurrent request can hold one MongoDB connection, so size the pool
+# to the worker's concurrency, capped so workers * pool stays within what
+# mongod accepts. Requests beyond the pool wait up to the queue timeout.
+concurrency = worker_connections if worker_kind in ("gevent", "eventlet") else threads
+# +2 covers the log writer and journal replay threads
+os.environ.setdefault("MONGO_MAX_POOL_SIZE", str(min(concurrency + 2, int(os.getenv("MONGO_POOL_CAP", "200")))))
+os.environ.setdefault("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")
+os.environ.setdefault("SOCKETIO_ASYNC_MODE", SOCKETIO_ASYNC_MODES[worker_kind])
+
+# Workers connect to MongoDB lazily after fork, so preloading is safe; it
+# saves memory but a HUP then can't pick up new code, so it is opt-in.
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers now and then, staggered so they don't all restart at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+
+
+def on_starting(server):
+    if workers > 1 and not os.getenv("SOCKETIO_MESSAGE_QUEUE"):
+        server.log.warning(
+            "%d workers without SOCKETIO_MESSAGE_QUEUE: dashboards only get scans from their own worker", workers
+        )
+
+
+def worker_exit(server, worker):
+    """Writes out buffered scans before a worker stops (shutdown, reload, recycling)."""
+    import main
+    try:
+        main.flush_pending_logs(timeout=graceful_timeout / 2)
+    except Exception:
+        server.log.exception("Failed to flush pending logs in worker %s", worker.pid)
@@ -0,0 +1,194 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+from datetime import datetime
+from dotenv import load_dotenv
+import argparse
+import json
+import os
+import sys
+
+# Indexes the service relies on, keyed by collection name
+INDEXES = {
+    "Users": [
+        IndexModel([("Matric", ASCENDING)], name="Matric_unique", unique=True),
+        # Not every user has a card yet, so only string tags must be unique
+        IndexModel(
+            [("tag", ASCENDING)],
+            name="tag_unique",
+            unique=True,
+            partialFilterExpression={"tag": {"$type": "string"}}
+        ),
+    ],
+    "Data": [
+        IndexModel([("Matric", ASCENDING), ("timestamp", DESCENDING)], name="Matric_timestamp"),
+        # Time ranges, and /gt_logs pages within one, which are keyset-paginated on (timestamp, _id)
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+        # /gt_logs?since= polls, which follow the ingestion sequence
+        IndexModel([("seq", ASCENDING)], name="seq"),
+    ],
+    "Rollups": [
+        IndexModel(
+            [("period", ASCENDING), ("start", ASCENDING), ("Matric", ASCENDING), ("Status", ASCENDING), ("reader", ASCENDING)],
+            name="period_start_dimensions",
+            unique=True
+        ),
+    ],
+    "RollupTotals": [
+        IndexModel(
+            [("period", ASCENDING), ("start", ASCENDING), ("Status", ASCENDING), ("reader", ASCENDING)],
+            name="period_start_dimensions",
+            unique=True
+        ),
+    ],
+}
+
+# Representative queries from main.py that must not fall back to a COLLSCAN
+CHECKED_QUERIES = [
+    ("Users", "find_user by Matric", {"Matric": "__probe__"}, None),
+    ("Users", "find_user by tag", {"tag": "__probe__"}, None),
+    ("Data", "gt_logs page", {}, [("_id", DESCENDING)]),
+    ("Data", "gt_logs since", {"seq": {"$gt": 0}}, [("seq", ASCENDING)]),
+    ("Data", "logs by matric", {"Matric": "__probe__"}, [("timestamp", DESCENDING)]),
+    ("Data", "logs by time range", {"timestamp": {"$gte": datetime(2000, 1, 1), "$lt": datetime(2000, 1, 2)}}, None),
+    (
+        "Data", "gt_logs page in a time range",
+        {"timestamp": {"$gte": datetime(2000, 1, 1), "$lt": datetime(2000, 1, 2)}},
+        [("timestamp", DESCENDING), ("_id", DESCENDING)]
+    ),
+]
+
+
+def _index_options(document):
+    """The options that make two indexes on the same keys behave differently."""
+    return bool(document.get("unique")), document.get("partialFilterExpression")
+
+
+def _check_models(collection, models):
+    """
+    Sorts models into (missing, conflicting). A model is satisfied by any
+    index with the same key pattern and options, whatever it's called;
+    one with the same keys but different unique/partial options conflicts
+    with it, as a list of (model, existing index name).
+    """
+    existing = collection.index_information()
+    missing = []
+    conflicting = []
+    for model in models:
+        keys = list(model.document["key"].items())
+        same_keys = {name: info for name, info in existing.items() if list(info["key"]) == keys}
+        if any(_index_options(info) == _index_options(model.document) for info in same_keys.values()):
+            continue
+        if same_keys:
+            conflicting.extend((model, name) for name in same_keys)
+        else:
+            missing.append(model)
+    return missing, conflicting
+
+
+def ensure_indexes(db, replace_conflicting=False):
+    """
+    Creates any missing indexes. Safe to run repeatedly; returns the names created.
+
+    An existing index on the same keys with other options (say a plain
+    Matric_1 where Matric_unique should be) blocks creation. It is left
+    alone and reported by verify_indexes, unless `replace_conflicting`
+    drops it first.
+    """
+    created = []
+    for collection_name, models in INDEXES.items():
+        missing, conflicting = _check_models(db[collection_name], models)
+        if replace_conflicting:
+            for model, name in conflicting:
+                db[collection_name].drop_index(name)
+            missing.extend(model for model, _ in conflicting)
+        if missing:
+            created.extend(db[collection_name].create_indexes(missing))
+    return created
+
+
+def missing_indexes(db):
+    """Returns "Collection.index" names from INDEXES that don't exist yet."""
+    return [
+        f"{collection_name}.{model.document['name']}"
+        for collection_name, models in INDEXES.items()
+        for model in _check_models(db[collection_name], models)[0]
+    ]
+
+
+def conflicting_indexes(db):
+    """Returns "Collection.index (existing name)" for INDEXES entries an existing index blocks."""
+    return [
+        f"{collection_name}.{model.document['name']} (conflicts with {name})"
+        for collection_name, models in INDEXES.items()
+        for model, name in _check_models(db[collection_name], models)[1]
+    ]
+
+
+def _plan_stages(plan):
+    """Yields every stage name in an explain plan tree."""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        yield from _plan_stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def collscan_queries(db):
+    """
+    Returns the labels of CHECKED_QUERIES whose winning plan is a COLLSCAN,
+    or sorts in memory instead of reading the sort order from an index.
+    """
+    collscans = []
+    for collection_name, label, query, sort in CHECKED_QUERIES:
+        cursor = db[collection_name].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        stages = set(_plan_stages(cursor.explain()["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            collscans.append(f"{collection_name}: {label}")
+        elif sort and "SORT" in stages:
+            collscans.append(f"{collection_name}: {label} (blocking sort)")
+    return collscans
+
+
+def verify_indexes(db):
+    """Reports missing and conflicting indexes and representative queries that COLLSCAN."""
+    return {
+        "missing": missing_indexes(db),
+        "conflicting": conflicting_indexes(db),
+        "collscans": collscan_queries(db),
+    }
+
+
+def run(db, check=False, replace_conflicting=False, report=print):
+    """
+    Creates missing indexes (unless `check`) and prints the verification
+    report. Returns the exit status: 1 if any index is missing or
+    conflicting or a checked query COLLSCANs, else 0.
+    """
+    if not check:
+        created = ensure_indexes(db, replace_conflicting)
+        report("Created indexes: " + (", ".join(created) if created else "none"))
+
+    problems = verify_indexes(db)
+    report(json.dumps(problems, indent=2))
+    return 1 if problems["missing"] or problems["conflicting"] or problems["collscans"] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create and verify MongoDB indexes for the RFID backend.")
+    parser.add_argument("--check", action="store_true", help="only report, don't create anything")
+    parser.add_argument("--replace-conflicting", action="store_true",
+                        help="drop existing indexes whose options differ from INDEXES and recreate them")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = MongoClient(os.environ["DATABASE_URL"]).get_database()
+
+    return run(db, args.check, args.replace_conflicting)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
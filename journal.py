@@ -0,0 +1,231 @@
+from bson import ObjectId, decode, encode
+import errno
+import glob
+import logging
+import mmap
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows dev machines run one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def claim_directory(base, max_slots=256):
+    """
+    Claims a journal directory under `base` that no live process is using.
+
+    Each process holds an exclusive lock on `<base>/<n>/.lock` for its
+    lifetime. The lock goes away when the process dies, so a restarted
+    worker adopts (and replays) whatever its predecessor left behind.
+    Returns (directory, lock file).
+    """
+    for slot in range(max_slots):
+        directory = os.path.join(base, str(slot))
+        os.makedirs(directory, exist_ok=True)
+        if fcntl is None:
+            return directory, None
+        lock_file = open(os.path.join(directory, ".lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as exc:
+            lock_file.close()
+            if exc.errno in (errno.EAGAIN, errno.EACCES):
+                continue
+            raise
+        return directory, lock_file
+    raise RuntimeError(f"No free journal directory under {base}")
+
+
+def iter_segment(path, use_mmap=False):
+    """
+    Yields the log entries stored in one segment file.
+
+    Segments are plain concatenated BSON documents, which carry their own
+    length prefix. A torn write at the end of the file (from a crash
+    mid-append) is ignored.
+    """
+    with open(path, "rb") as f:
+        if use_mmap:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = f.read()
+        try:
+            offset = 0
+            while offset + 4 <= len(data):
+                length = int.from_bytes(data[offset:offset + 4], "little")
+                if length < 5 or offset + length > len(data):
+                    logger.warning("Ignoring torn entry at byte %d of %s", offset, path)
+                    break
+                yield decode(data[offset:offset + length])
+                offset += length
+        finally:
+            if use_mmap:
+                data.close()
+
+
+class Journal:
+    """
+    Append-only local journal for log entries that couldn't reach MongoDB.
+
+    Entries are written as BSON to numbered segment files in `directory`,
+    so dates and ObjectIds survive the round trip. fsync is batched: it
+    runs once `fsync_batch` entries have accumulated, and a background
+    thread syncs the rest every `fsync_interval` seconds, trading a small
+    loss window for far fewer disk flushes.
+    Every entry gets an _id before it is journaled, which makes replay
+    idempotent against inserts that did reach the server.
+
+    A journal belongs to one process; create it after forking.
+    """
+
+    def __init__(self, base_directory, segment_bytes=16 * 1024 * 1024, fsync_batch=100, fsync_interval=0.05, use_mmap=False):
+        self.directory, self._dir_lock = claim_directory(base_directory)
+        self.segment_bytes = segment_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.use_mmap = use_mmap
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._replay_thread = None
+        self._sync_thread = None
+        self._stop = threading.Event()
+        existing = self.segments()
+        self._backlog = bool(existing)
+        self._next_segment = max((self._segment_number(path) for path in existing), default=0) + 1
+
+    @staticmethod
+    def _segment_number(path):
+        return int(os.path.basename(path)[len("segment-"):-len(".bson")])
+
+    def segments(self):
+        """Returns segment paths, oldest first."""
+        return sorted(glob.glob(os.path.join(self.directory, "segment-*.bson")))
+
+    def has_backlog(self):
+        """True while any journaled entries are waiting to be replayed."""
+        return self._backlog
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, f"segment-{self._next_segment:012d}.bson")
+        self._next_segment += 1
+        self._file = open(path, "ab")
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def append(self, entries):
+        """Durably queues log entries for replay."""
+        with self._lock:
+            self._backlog = True
+            if self._file is None:
+                self._open_segment()
+            for entry in entries:
+                entry.setdefault("_id", ObjectId())
+                self._file.write(encode(entry))
+            self._unsynced += len(entries)
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+            if self._file.tell() >= self.segment_bytes:
+                self._close_segment()
+            if self._sync_thread is None:
+                self._sync_thread = threading.Thread(target=self._sync_loop, name="journal-sync", daemon=True)
+                self._sync_thread.start()
+
+    def sync(self):
+        """Flushes any entries that haven't been fsynced yet."""
+        with self._lock:
+            if self._file is not None and self._unsynced:
+                self._sync()
+
+    def _sync_loop(self):
+        # Covers the tail of a burst, which no later append will sync
+        while not self._stop.wait(self.fsync_interval):
+            self.sync()
+
+    def close(self):
+        """Stops the sync thread and fsyncs what is left."""
+        self._stop.set()
+        self.sync()
+
+    def _drain(self, path, insert, batch_size):
+        """Inserts one segment's entries in batches, then deletes it; returns the count."""
+        replayed = 0
+        batch = []
+        for entry in iter_segment(path, self.use_mmap):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                insert(batch)
+                replayed += len(batch)
+                batch = []
+        if batch:
+            insert(batch)
+            replayed += len(batch)
+        os.remove(path)
+        return replayed
+
+    def replay(self, insert, batch_size=1000):
+        """
+        Drains every segment through `insert`, oldest first.
+
+        A segment is deleted only after all of its entries were inserted;
+        if `insert` raises, the segment stays and the error propagates.
+        Returns the number of entries replayed.
+        """
+        # Seal the active segment so appends during the replay go to a new one
+        with self._lock:
+            self._close_segment()
+            paths = self.segments()
+
+        replayed = 0
+        for path in paths:
+            replayed += self._drain(path, insert, batch_size)
+
+        # Whatever was appended meanwhile is drained holding the lock, so new
+        # appends can't keep the backlog alive forever. It is usually small:
+        # callers stop journaling once inserts succeed again.
+        with self._lock:
+            self._close_segment()
+            for path in self.segments():
+                replayed += self._drain(path, insert, batch_size)
+            self._backlog = False
+        return replayed
+
+    def start_replay(self, insert, interval=5.0, batch_size=1000):
+        """Starts a daemon thread, once, that keeps draining the journal."""
+        with self._lock:
+            if self._replay_thread is None or not self._replay_thread.is_alive():
+                self._replay_thread = threading.Thread(
+                    target=self._replay_loop, args=(insert, interval, batch_size),
+                    name="journal-replay", daemon=True
+                )
+                self._replay_thread.start()
+
+    def _replay_loop(self, insert, interval, batch_size):
+        while True:
+            time.sleep(interval)
+            self.sync()
+            if not self.has_backlog():
+                continue
+            try:
+                replayed = self.replay(insert, batch_size)
+                logger.info("Replayed %d journaled log entries", replayed)
+            except Exception as exc:
+                logger.warning("Journal replay failed, will retry: %s", exc)
@@ -0,0 +1,49 @@
+from flask.json.provider import DefaultJSONProvider
+from bson import ObjectId
+from datetime import date, datetime
+from timestamps import format_timestamp
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _default(o):
+    """Encodes the BSON and date types that appear in log documents."""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, datetime):
+        return format_timestamp(o)
+    if isinstance(o, date):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that uses orjson when it is installed, stdlib json otherwise.
+
+    Either way datetimes are written as ISO 8601 UTC with a trailing Z
+    (matching timestamps.format_timestamp) and ObjectIds as hex strings.
+    Keys aren't sorted by default, since sorting large log pages costs CPU.
+    """
+
+    default = staticmethod(_default)
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            kwargs.setdefault("separators", (",", ":"))
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
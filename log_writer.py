@@ -0,0 +1,93 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LogWriter:
+    """
+    Buffers access log entries and writes them in batches on a background thread.
+
+    `insert` is called with a list of entries whenever `batch_size` entries
+    are queued or `flush_interval` seconds have passed since the first one.
+    When the queue is full, `submit` blocks for up to `put_timeout` seconds
+    and then writes the entry itself, so a slow database pushes back on
+    callers instead of dropping scans.
+    """
+
+    def __init__(self, insert, max_queue=10000, batch_size=500, flush_interval=0.2, put_timeout=1.0):
+        self.insert = insert
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so a forked worker starts its own
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._stop.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, entry):
+        """Queues one log entry for the next batch."""
+        self._ensure_started()
+        try:
+            self._queue.put(entry, timeout=self.put_timeout)
+        except queue.Full:
+            logger.warning("Log queue full, writing entry synchronously")
+            self._write([entry])
+
+    def pending(self):
+        """Returns the approximate number of queued entries."""
+        return self._queue.qsize()
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = 0 if self._stop.is_set() else deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            self.insert(batch)
+        except Exception:
+            logger.exception("Failed to write %d log entries", len(batch))
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+            elif self._stop.is_set():
+                return
+
+    def close(self, timeout=10):
+        """Flushes everything still queued and stops the writer thread."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            thread.join(timeout)
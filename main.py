@@ -1,77 +1,1206 @@
-from flask import Flask, request, jsonify
-from pymongo import MongoClient
-from datetime import datetime
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, send_file, stream_with_context
+from pymongo import MongoClient, ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, ConnectionFailure, ExecutionTimeout, PyMongoError, WTimeoutError
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from flask_cors import CORS
+from flask_socketio import SocketIO, join_room, leave_room
+from timeseries import create_timeseries_collection, log_meta
+from timestamps import format_timestamp, parse_timestamp
+from dedup import ScanDebouncer, collapse_repeats
+from export import COLUMNAR_FORMATS, EXPORT_FORMATS, ExportJobs, iter_csv, pa
+from indexes import ensure_indexes, run as run_indexes
+from journal import Journal
+from json_provider import FastJSONProvider
+from log_writer import LogWriter
+from metrics import SIZE_BUCKETS, CommandTimer, Registry
+from profiling import RequestProfiler, SpanTimer
+from rollups import PERIODS, period_start, summarize, update_rollups
+from user_cache import MISSING, UserCache, start_users_watcher
+from write_profiles import check_profile, group_by_profile, parse_reader_profiles, with_profile
+from contextlib import contextmanager, nullcontext
+import atexit
+import base64
+import click
+import hashlib
+import logging
 import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-# Flask App Initialization
-app = Flask(__name__)
-CORS(app)
+# Routes live on a blueprint that create_app() registers, so importing this
+# module builds no app and opens no connections
+bp = Blueprint("rfid", __name__, cli_group=None)
+socketio = SocketIO()
+
+# SocketIO namespace that live dashboards subscribe to
+EVENTS_NAMESPACE = "/events"
+
+# Prometheus metrics served at /metrics. Each worker process keeps its own,
+# so scrape workers individually or sum over the instance label.
+metrics = Registry()
+request_seconds = metrics.histogram(
+    "rfid_http_request_duration_seconds", "Time to produce a response (to the first byte when streamed).",
+    ("route", "method", "status")
+)
+request_bytes = metrics.histogram("rfid_http_request_size_bytes", "Request body size.", ("route",), SIZE_BUCKETS)
+response_bytes = metrics.histogram(
+    "rfid_http_response_size_bytes", "Response body size, where known up front.", ("route",), SIZE_BUCKETS
+)
+access_decisions = metrics.counter("rfid_access_decisions_total", "Scans answered, by decision.", ("decision",))
+mongo_command_seconds = metrics.histogram(
+    "rfid_mongo_command_duration_seconds", "MongoDB command round-trip time.", ("command", "collection", "outcome")
+)
+log_writes = metrics.counter("rfid_log_writes_total", "Log entries written to Data, by write profile.", ("profile",))
+log_insert_seconds = metrics.histogram(
+    "rfid_log_insert_duration_seconds", "Data insert time per batch, by write profile.", ("profile",)
+)
+metrics.gauge("rfid_log_writer_pending", "Log entries queued for the background writer.", lambda: log_writer.pending())
+
+# SERVER_TIMING=1 adds a Server-Timing header breaking /log and /gt_logs
+# down by phase. Off by default: it tells clients where the time goes.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+# cProfile capture of every PROFILE_SAMPLE_EVERY-th request, and of requests
+# sending X-Profile: <PROFILE_TOKEN>, written to PROFILE_DIR
+request_profiler = RequestProfiler(
+    os.getenv("PROFILE_DIR", "profiles"),
+    sample_every=int(os.getenv("PROFILE_SAMPLE_EVERY", "0")),
+    token=os.getenv("PROFILE_TOKEN") or None
+)
+
+def span(name):
+    """Times a phase of the current request when Server-Timing is on."""
+    timer = g.get("span_timer")
+    return timer.span(name) if timer is not None else nullcontext()
 
-# MongoDB Connection
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("Missing DATABASE_URL environment variable")
+# MongoDB Connection. MongoClient isn't fork-safe, so each process builds its
+# own on first use; a database passed to create_app() replaces it entirely.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_db = None
+_injected_db = None
 
-client = MongoClient(DATABASE_URL)
-db = client.get_database()
+# MongoClient pool and timeout settings, read when a process connects
+MONGO_CLIENT_OPTIONS = (
+    ("maxPoolSize", "MONGO_MAX_POOL_SIZE"),
+    ("minPoolSize", "MONGO_MIN_POOL_SIZE"),
+    ("maxIdleTimeMS", "MONGO_MAX_IDLE_TIME_MS"),
+    ("waitQueueTimeoutMS", "MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+    ("connectTimeoutMS", "MONGO_CONNECT_TIMEOUT_MS"),
+    ("socketTimeoutMS", "MONGO_SOCKET_TIMEOUT_MS"),
+)
+
+def mongo_client_options():
+    """Keyword arguments for this process's MongoClient."""
+    # Fail fast when MongoDB is unreachable so scans fall back to the journal
+    options = {"serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))}
+    for option, variable in MONGO_CLIENT_OPTIONS:
+        if os.getenv(variable):
+            options[option] = int(os.environ[variable])
+    return options
 
 def get_db():
-    """Returns the database instance."""
-    return db
+    """Returns the database, connecting on first use in each process."""
+    global _client, _client_pid, _db
+    if _injected_db is not None:
+        return _injected_db
+    if _client_pid != os.getpid():
+        with _client_lock:
+            if _client_pid != os.getpid():
+                database_url = os.getenv("DATABASE_URL")
+                if not database_url:
+                    raise ValueError("Missing DATABASE_URL environment variable")
+                # A client inherited across fork is abandoned, not closed: its
+                # sockets belong to the parent
+                _client = MongoClient(
+                    database_url,
+                    event_listeners=[CommandTimer(mongo_command_seconds)],
+                    **mongo_client_options()
+                )
+                _db = _client.get_database()
+                _client_pid = os.getpid()
+    return _db
 
-@app.route("/log", methods=["POST"])
-def access_check():
+# When a MongoDB round trip last failed in this process (time.monotonic()),
+# or None once one has succeeded since. For MONGO_RETRY_INTERVAL seconds
+# after a failure, scans answer from the user cache and go straight to the
+# journal rather than each waiting out the server selection timeout; the
+# next scan after that tries MongoDB again.
+OUTAGE_ERRORS = (ConnectionFailure, ExecutionTimeout, WTimeoutError)
+MONGO_RETRY_INTERVAL = float(os.getenv("MONGO_RETRY_INTERVAL", "5"))
+_mongo_failed_at = None
+
+def mongo_down():
+    """True if MongoDB failed within the last MONGO_RETRY_INTERVAL seconds."""
+    failed_at = _mongo_failed_at
+    return failed_at is not None and time.monotonic() - failed_at < MONGO_RETRY_INTERVAL
+
+@contextmanager
+def mongo_round_trip():
+    """Records whether the MongoDB calls inside failed with an outage error, for mongo_down()."""
+    global _mongo_failed_at
+    try:
+        yield
+    except OUTAGE_ERRORS:
+        _mongo_failed_at = time.monotonic()
+        raise
+    _mongo_failed_at = None
+
+# In-process user cache for the /log hot path, keyed by ("Matric", value)
+# and ("tag", value) so either identifier resolves without a round trip
+user_cache = UserCache(
+    max_entries=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "300")),
+    negative_ttl=float(os.getenv("USER_CACHE_NEGATIVE_TTL", "30"))
+)
+_users_watcher = None
+_users_watcher_lock = threading.Lock()
+
+def ensure_users_watcher():
+    """Starts the Users change-stream watcher on first use."""
+    global _users_watcher
+    if _users_watcher is None and os.getenv("USER_CACHE_WATCH", "1") == "1":
+        with _users_watcher_lock:
+            if _users_watcher is None:
+                _users_watcher = start_users_watcher(get_db()["Users"], user_cache)
+
+# Fields a scan may identify the card holder by; Matric wins if both are sent
+USER_KEYS = (("matric", "Matric"), ("tag", "tag"))
+
+def is_scan_value(value):
+    """True for the values scans may identify or label by: strings and integers BSON can hold."""
+    return isinstance(value, str) or (isinstance(value, int) and -2 ** 63 <= value < 2 ** 63)
+
+def scan_identity(scan):
+    """Returns the (Users field, value) a scan identifies its user by, or None."""
+    for arg, field in USER_KEYS:
+        if is_scan_value(scan.get(arg)):
+            return field, scan[arg]
+    return None
+
+# Scan fields stored as given. They also key write profiles, rollups and
+# repeat detection, so anything unhashable would sink a whole batch.
+SCAN_LABELS = ("status", "reader", "door")
+
+def scan_labels(scan):
+    """Returns a scan's (status, reader, door), raising ValueError unless each is_scan_value or absent."""
+    labels = tuple(scan.get(field) for field in SCAN_LABELS)
+    for field, value in zip(SCAN_LABELS, labels):
+        if value is not None and not is_scan_value(value):
+            raise ValueError(f"Invalid {field}")
+    return labels
+
+def cache_user(key, user):
+    """Caches a lookup result, and a found user under all of its identifiers."""
+    user_cache.put(key, user)
+    if user is not None:
+        user_cache.put(("Matric", user.get("Matric")), user)
+        if user.get("tag") is not None:
+            user_cache.put(("tag", user["tag"]), user)
+
+def find_user(field, value, cached_only=False):
     """
-    Logs access attempts.
+    Looks up a user by Matric or tag, answering from user_cache when possible.
+    With `cached_only`, a cache miss raises ConnectionFailure instead of querying.
     """
-    db = get_db()
-    users_collection = db["Users"]
-    logs_collection = db["Data"]
+    ensure_users_watcher()
+    user = user_cache.get((field, value))
+    if user is MISSING:
+        if cached_only:
+            raise ConnectionFailure("MongoDB down, not querying for a cache miss")
+        with mongo_round_trip():
+            user = get_db()["Users"].find_one({field: value})
+        cache_user((field, value), user)
+    return user
 
-    data = request.json
-    if not data or "matric" not in data:
-        return jsonify({"error": "Missing matric"}), 400
-
-    matric = data["matric"]
-    timestamp = data.get("timestamp", datetime.utcnow().isoformat())
-    Status = data.get("status")
+def find_users(keys, cached_only=False):
+    """
+    Resolves many (field, value) identities at once, with at most one $in
+    query per field for cache misses. With `cached_only`, any cache miss
+    raises ConnectionFailure instead.
+    """
+    ensure_users_watcher()
+    users = {}
+    misses = {}
+    for key in set(keys):
+        user = user_cache.get(key)
+        if user is MISSING:
+            misses.setdefault(key[0], []).append(key[1])
+        else:
+            users[key] = user
+    if misses and cached_only:
+        raise ConnectionFailure("MongoDB down, not querying for cache misses")
 
-    user = users_collection.find_one({"Matric": matric})
+    for field, values in misses.items():
+        with mongo_round_trip():
+            found = {user.get(field): user for user in get_db()["Users"].find({field: {"$in": values}})}
+        for value in values:
+            users[(field, value)] = found.get(value)
+            cache_user((field, value), users[(field, value)])
+    return users
 
+def build_log_entry(user, identity, status, timestamp, reader=None, door=None):
+    """Builds the Data document recorded for one scan, given its scan_identity."""
+    field, value = identity
     log_entry = {
-        "tag": user.get("tag") if user else None,
+        "tag": user.get("tag") if user else (value if field == "tag" else None),
         "Name": user.get("Name") if user else "Unknown",
-        "Matric": matric,
-        "Status": Status,
+        "Matric": user.get("Matric") if user else (value if field == "Matric" else None),
+        "Status": status,
         "timestamp": timestamp
     }
+    # Only readers that identify themselves get these fields
+    if reader is not None:
+        log_entry["reader"] = reader
+    if door is not None:
+        log_entry["door"] = door
+    return log_entry
+
+def event_rooms(reader=None, door=None):
+    """Returns the SocketIO rooms a scan from this reader/door is pushed to."""
+    rooms = ["all"]
+    if reader is not None:
+        rooms.append(f"reader:{reader}")
+    if door is not None:
+        rooms.append(f"door:{door}")
+    return rooms
+
+def publish_scan(log_entry, granted):
+    """Pushes a compact access event to subscribed dashboards."""
+    reader = log_entry.get("reader")
+    door = log_entry.get("door")
+    socketio.emit("access", {
+        "matric": log_entry["Matric"],
+        "tag": log_entry["tag"],
+        "name": log_entry["Name"],
+        "status": log_entry["Status"],
+        "timestamp": format_timestamp(log_entry["timestamp"]),
+        "granted": granted,
+        "reader": reader,
+        "door": door
+    }, to=event_rooms(reader, door), namespace=EVENTS_NAMESPACE)
+
+# Keep the hourly/daily Rollups and RollupTotals collections current as logs are written
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "1") == "1"
+
+# "timeseries" stores Data as a MongoDB time-series collection (see timeseries.py)
+LOG_STORAGE = os.getenv("LOG_STORAGE", "collection")
+
+# Write acknowledgement for log inserts: a write_profiles.WRITE_PROFILES name,
+# or unset for the client's default. READER_WRITE_PROFILES overrides it per
+# reader, e.g. {"lab-1": "fire-and-forget"}; ROLLUPS_WRITE_PROFILE is the
+# profile for rollup updates.
+LOG_WRITE_PROFILE = check_profile(os.getenv("LOG_WRITE_PROFILE") or None)
+READER_WRITE_PROFILES = parse_reader_profiles(os.getenv("READER_WRITE_PROFILES"))
+ROLLUPS_WRITE_PROFILE = check_profile(os.getenv("ROLLUPS_WRITE_PROFILE") or None)
+
+# Long-polling /gt_logs?since= requests wait on this for writes from this process
+_new_logs = threading.Condition()
+
+# Every stored log gets the next `seq` from a counter document shared by all
+# workers, and the server time its batch was numbered at as `ingested`.
+# ?since= polls follow seq rather than _id, whose order differs per process.
+# The same document counts stored logs in `stored`, for the /gt_logs ETag.
+SEQUENCE_COUNTER = "Data"
+
+# `ingested` is MongoDB's clock, which may be off from this host's, so the
+# ?since= cutoff is taken on MongoDB's clock too: (offset from ours, when
+# measured). Every stamp measures it; polls re-measure it once it's stale.
+_server_clock = None
+SERVER_CLOCK_TTL = 60
+
+def stamp_server_time(counter_id, update=None):
+    """
+    Applies `update` to a Counters document, stamping its `at` with MongoDB's
+    clock, and measures that clock's offset from ours. Returns the document.
+    """
+    global _server_clock
+    sent = datetime.utcnow()
+    document = get_db()["Counters"].find_one_and_update(
+        {"_id": counter_id},
+        dict(update or {}, **{"$currentDate": {"at": True}}),
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    received = datetime.utcnow()
+    _server_clock = (document["at"] - (sent + (received - sent) / 2), time.monotonic())
+    return document
+
+def server_now():
+    """MongoDB's current time, from the last measured clock offset."""
+    if _server_clock is None or time.monotonic() - _server_clock[1] > SERVER_CLOCK_TTL:
+        stamp_server_time("clock")
+    return datetime.utcnow() + _server_clock[0]
+
+def stamp_sequence(entries):
+    """Numbers log entries for ?since= polls, replacing any earlier (journaled) stamp."""
+    counter = stamp_server_time(SEQUENCE_COUNTER, {"$inc": {"seq": len(entries)}})
+    first = counter["seq"] - len(entries) + 1
+    for offset, entry in enumerate(entries):
+        entry["seq"] = first + offset
+        entry["ingested"] = counter["at"]
+
+def insert_data(collection, entries):
+    """
+    Inserts log entries in one round trip; returns the ones that were new.
+
+    Entries whose _id already exists (a journal replay of a write that did
+    land) are skipped rather than treated as errors. A write concern that
+    timed out raises WTimeoutError, as for single-document writes.
+    """
+    try:
+        collection.insert_many(entries, ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        concern_errors = exc.details.get("writeConcernErrors")
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        if concern_errors:
+            if all(error.get("code") == 64 for error in concern_errors):
+                raise WTimeoutError(concern_errors[0].get("errmsg", "Write concern timed out"), 64, exc.details) from exc
+            raise
+        duplicates = {error["index"] for error in errors}
+        return [entry for index, entry in enumerate(entries) if index not in duplicates]
+    return entries
+
+def insert_logs(entries):
+    """
+    Writes a batch of log entries to Data, one insert per write profile
+    among the entries' readers (usually just one).
+    """
+    if LOG_STORAGE == "timeseries":
+        for entry in entries:
+            entry["meta"] = log_meta(entry)
+    stored = []
+    try:
+        with mongo_round_trip():
+            stamp_sequence(entries)
+            for profile, group in group_by_profile(entries, LOG_WRITE_PROFILE, READER_WRITE_PROFILES).items():
+                began = time.perf_counter()
+                inserted = insert_data(with_profile(get_db()["Data"], profile), group)
+                log_insert_seconds.observe(time.perf_counter() - began, profile or "default")
+                log_writes.inc(profile or "default", amount=len(inserted))
+                stored.extend(inserted)
+    finally:
+        # Even if a later group failed (and the whole batch gets journaled), the
+        # earlier ones are stored; replay will skip them as duplicates
+        if stored:
+            record_stored_logs(stored)
+
+def record_stored_logs(entries):
+    """Counts newly stored log entries, wakes long polls and updates rollups."""
+    try:
+        get_db()["Counters"].update_one({"_id": SEQUENCE_COUNTER}, {"$inc": {"stored": len(entries)}}, upsert=True)
+    except PyMongoError:
+        # Until the next write, /gt_logs may answer 304 for these logs
+        logger.exception("Failed to count %d stored log entries", len(entries))
+    with _new_logs:
+        _new_logs.notify_all()
+
+    if ROLLUPS_ENABLED:
+        try:
+            update_rollups(with_profile(get_db(), ROLLUPS_WRITE_PROFILE), entries)
+        except Exception:
+            # The logs are already stored; `python rollups.py` can recount them
+            logger.exception("Failed to update rollups for %d log entries", len(entries))
+
+def replay_logs(entries):
+    """Journal replay: writes entries with insert_logs, minus any that already landed."""
+    if LOG_STORAGE == "timeseries":
+        # Time-series collections don't enforce a unique _id, so insert_data
+        # can't skip them; look them up within the batch's time range instead
+        timestamps = [entry["timestamp"] for entry in entries]
+        stored = {log["_id"] for log in get_db()["Data"].find({
+            "timestamp": {"$gte": min(timestamps), "$lte": max(timestamps)},
+            "_id": {"$in": [entry["_id"] for entry in entries]}
+        }, {"_id": 1})}
+        entries = [entry for entry in entries if entry["_id"] not in stored]
+    if entries:
+        insert_logs(entries)
+
+# Local write-ahead journal that takes log entries while MongoDB is unreachable
+JOURNAL_ENABLED = os.getenv("JOURNAL_ENABLED", "1") == "1"
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journal")
+_journal = None
+_journal_pid = None
+_journal_lock = threading.Lock()
+
+def get_journal():
+    """Returns this process's journal, creating it (and its replay thread) on first use."""
+    global _journal, _journal_pid
+    if _journal_pid != os.getpid():
+        with _journal_lock:
+            if _journal_pid != os.getpid():
+                _journal = Journal(
+                    JOURNAL_DIR,
+                    segment_bytes=int(os.getenv("JOURNAL_SEGMENT_BYTES", str(16 * 1024 * 1024))),
+                    fsync_batch=int(os.getenv("JOURNAL_FSYNC_BATCH", "100")),
+                    fsync_interval=float(os.getenv("JOURNAL_FSYNC_INTERVAL", "0.05")),
+                    use_mmap=os.getenv("JOURNAL_MMAP", "0") == "1"
+                )
+                _journal.start_replay(replay_logs, interval=float(os.getenv("JOURNAL_REPLAY_INTERVAL", "5")))
+                _journal_pid = os.getpid()
+    return _journal
+
+def store_logs(entries):
+    """
+    Writes log entries to Data, or to the local journal if MongoDB is down.
+
+    Right after a failure (see mongo_down) new entries go straight to the
+    journal so scans don't wait on a database that is known to be failing;
+    the replay thread drains it once MongoDB answers again, while new
+    entries are inserted directly.
+    """
+    if not JOURNAL_ENABLED:
+        insert_logs(entries)
+        return
+
+    journal = get_journal()
+    if mongo_down():
+        journal.append(entries)
+        return
+    try:
+        insert_logs(entries)
+    except OUTAGE_ERRORS as exc:
+        logger.warning("MongoDB unavailable, journaling %d log entries: %s", len(entries), exc)
+        journal.append(entries)
+
+# Background batching writer for /log; LOG_WRITER_ASYNC=0 writes inline instead
+LOG_WRITER_ASYNC = os.getenv("LOG_WRITER_ASYNC", "1") == "1"
+log_writer = LogWriter(
+    store_logs,
+    max_queue=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("LOG_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", "0.2"))
+)
+atexit.register(log_writer.close)
+
+def write_log(entry):
+    """Hands a log entry to the background writer, or writes it inline."""
+    if LOG_WRITER_ASYNC:
+        log_writer.submit(entry)
+    else:
+        store_logs([entry])
+
+# Repeated reports of one card at one reader within this many seconds are
+# collapsed into a single log entry with a repeat_count; 0 (the default)
+# disables it. Collapsed scans are held in this process's memory for up to
+# two windows, so a crash loses them and /gt_logs doesn't show them until
+# then; each worker also only collapses the repeats it receives itself.
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "0"))
+scan_debouncer = ScanDebouncer(DEDUP_WINDOW, write_log) if DEDUP_WINDOW > 0 else None
+if scan_debouncer is not None:
+    # Registered after the writer so it runs first at exit and its entries get flushed
+    atexit.register(scan_debouncer.close)
+
+def flush_pending_logs(timeout=10):
+    """
+    Writes out every log entry this process still holds in memory: held
+    repeats, the writer's queue and unsynced journal appends. For server
+    shutdown hooks; atexit covers the writer and debouncer on plain exits.
+    """
+    if scan_debouncer is not None:
+        scan_debouncer.close()
+    log_writer.close(timeout)
+    if _journal_pid == os.getpid():
+        _journal.sync()
+
+def scan_key(log_entry):
+    """Identifies repeat reports of the same card at the same reader."""
+    return (log_entry["Matric"] or log_entry["tag"], log_entry.get("reader"))
+
+# Largest offline buffer a reader may upload in one /log/batch call
+MAX_BATCH_SCANS = int(os.getenv("LOG_MAX_BATCH_SCANS", "1000"))
+
+# Background exports are written here and served from /export/jobs
+EXPORT_RECORD_BATCH_ROWS = int(os.getenv("EXPORT_RECORD_BATCH_ROWS", "10000"))
+export_jobs = ExportJobs(
+    os.getenv("EXPORT_DIR", "exports"),
+    max_workers=int(os.getenv("EXPORT_WORKERS", "2")),
+    batch_rows=EXPORT_RECORD_BATCH_ROWS
+)
+
+# Long-poll limits for /gt_logs?since=. Writes from other worker processes
+# don't notify this one, so waiting requests also re-check every interval.
+LONG_POLL_MAX_WAIT = float(os.getenv("LOGS_LONG_POLL_MAX_WAIT", "30"))
+LONG_POLL_INTERVAL = float(os.getenv("LOGS_LONG_POLL_INTERVAL", "1"))
+
+# ?since= only returns logs numbered at least this many seconds ago. Batches
+# are numbered before they are inserted and concurrent inserts can land out
+# of order, so a log must wait until every lower number has landed; keep it
+# above the slowest insert, write-concern waits included.
+SINCE_LAG = float(os.getenv("LOGS_SINCE_LAG", "2"))
 
-    logs_collection.insert_one(log_entry)
+# Pagination limits for /gt_logs
+DEFAULT_PAGE_SIZE = int(os.getenv("LOGS_DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("LOGS_MAX_PAGE_SIZE", "500"))
 
-    return jsonify({"message": "Access granted" if user else "Access denied"}), 200 if user else 403
+STREAM_MIMETYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json"
+}
 
+# Documents fetched per round trip when streaming full exports
+EXPORT_BATCH_SIZE = int(os.getenv("LOGS_EXPORT_BATCH_SIZE", "1000"))
 
-@app.route('/gt_logs', methods=['GET'])
+# Fields clients may request from Data via ?fields=
+LOG_FIELDS = ("tag", "Name", "Matric", "Status", "timestamp", "reader", "door", "repeat_count")
+DEFAULT_LOG_FIELDS = ("tag", "Name", "Matric", "timestamp")
+
+def parse_fields(value):
+    """Parses a comma-separated ?fields= value, or a list of field names, against LOG_FIELDS."""
+    names = value.split(",") if isinstance(value, str) else value or []
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError("Invalid fields")
+    fields = tuple(dict.fromkeys(field.strip() for field in names if field.strip()))
+    if not fields:
+        return DEFAULT_LOG_FIELDS
+    unknown = [field for field in fields if field not in LOG_FIELDS]
+    if unknown:
+        raise ValueError("Invalid fields: " + ", ".join(unknown))
+    return fields
+
+def log_projection(fields, include_id=False):
+    """Builds the MongoDB projection so only requested fields leave the server."""
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 1 if include_id else 0
+    return projection
+
+def serialize_log(log, fields=DEFAULT_LOG_FIELDS):
+    """Shapes a Data document for API responses; app.json encodes the dates."""
+    return {field: log.get(field) for field in fields}
+
+def export_filter(args):
+    """Builds the Data filter for exports: time range plus optional matric/status."""
+    query = time_range_query(args)
+    if args.get("matric"):
+        query["Matric"] = args["matric"]
+    if args.get("status"):
+        query["Status"] = args["status"]
+    return query
+
+def time_range_query(args):
+    """Builds the Data filter for ?from= (inclusive) and ?to= (exclusive)."""
+    time_range = {}
+    if args.get("from"):
+        time_range["$gte"] = parse_timestamp(args["from"])
+    if args.get("to"):
+        time_range["$lt"] = parse_timestamp(args["to"])
+    return {"timestamp": time_range} if time_range else {}
+
+def stream_logs(logs, fmt, fields=DEFAULT_LOG_FIELDS, chunk_rows=200):
+    """
+    Yields encoded log rows from a pymongo cursor without buffering them all.
+
+    `ndjson` emits one JSON object per line; `json` emits a single JSON
+    array written incrementally, so clients that expect the old list
+    response can still parse it. Rows are grouped into chunks of
+    `chunk_rows` to keep the number of socket writes down.
+    """
+    dumps = current_app.json.dumps
+    rows = []
+    count = 0
+
+    for log in logs:
+        row = dumps(serialize_log(log, fields))
+        if fmt == "ndjson":
+            rows.append(row + "\n")
+        else:
+            rows.append(("," if count else "[") + row)
+        count += 1
+        if len(rows) >= chunk_rows:
+            yield "".join(rows)
+            rows = []
+
+    if fmt == "json":
+        rows.append("]\n" if count else "[]\n")
+    if rows:
+        yield "".join(rows)
+
+def parse_wait(value):
+    """Parses ?wait= seconds, clamped to LONG_POLL_MAX_WAIT."""
+    if not value:
+        return 0
+    try:
+        wait = float(value)
+    except ValueError:
+        raise ValueError("Invalid wait")
+    if wait < 0:
+        raise ValueError("Invalid wait")
+    return min(wait, LONG_POLL_MAX_WAIT)
+
+def since_cutoff():
+    """The newest `ingested` time ?since= may return yet, on MongoDB's clock."""
+    return server_now() - timedelta(seconds=SINCE_LAG)
+
+def fetch_since(logs_collection, query, projection, since, limit, wait):
+    """
+    Returns up to `limit` logs numbered after `since`, oldest first.
+
+    When there are none yet, waits up to `wait` seconds for new writes
+    before giving up and returning an empty list.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        visible = dict(query, seq={"$gt": since}, ingested={"$lte": since_cutoff()})
+        logs = list(logs_collection.find(visible, projection).sort("seq", ASCENDING).limit(limit))
+        remaining = deadline - time.monotonic()
+        if logs or remaining <= 0:
+            return logs
+        with _new_logs:
+            _new_logs.wait(min(remaining, LONG_POLL_INTERVAL))
+
+def visible_sequence(logs_collection):
+    """The newest seq that ?since= polls can return yet, or 0."""
+    # The seq bound keeps the index walk off logs stored before seq existed
+    latest = logs_collection.find_one(
+        {"seq": {"$gt": 0}, "ingested": {"$lte": since_cutoff()}}, {"seq": 1}, sort=[("seq", DESCENDING)]
+    )
+    return latest["seq"] if latest else 0
+
+def logs_etag(logs_collection, visible):
+    """
+    Computes a validator for /gt_logs responses without reading any logs.
+
+    Combines the stored-log count every worker bumps after its inserts
+    (replays included), `visible` (the visible_sequence) and the query
+    string, so it changes whenever a log is stored or becomes visible to
+    polls, or the client asks for something different.
+    """
+    counter = logs_collection.database["Counters"].find_one({"_id": SEQUENCE_COUNTER}, {"stored": 1})
+    validator = "|".join([
+        str(counter.get("stored", 0)) if counter else "",
+        str(visible),
+        "&".join(sorted(f"{key}={value}" for key, value in request.args.items(multi=True)))
+    ])
+    return hashlib.blake2b(validator.encode("utf-8"), digest_size=16).hexdigest()
+
+# /gt_logs page orders. With a ?from=/?to= range, pages walk the timestamp_id
+# index so the range bounds and the order come from the same index scan.
+# Time-series collections have no _id index, so they always page that way.
+ID_SORT = [("_id", DESCENDING)]
+TIMESTAMP_SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+EPOCH = datetime(1970, 1, 1)
+
+def page_sort(query):
+    """Returns the sort for a /gt_logs page over `query`."""
+    return TIMESTAMP_SORT if "timestamp" in query or LOG_STORAGE == "timeseries" else ID_SORT
+
+def page_projection(fields, sort):
+    """Projection for a page: the requested fields plus the sort keys its cursor needs."""
+    projection = log_projection(fields, include_id=True)
+    for field, _ in sort:
+        projection[field] = 1
+    return projection
+
+def encode_page_cursor(log, sort):
+    """Encodes a page's last log as an opaque cursor for the given sort."""
+    raw = log["_id"].binary
+    if sort is TIMESTAMP_SORT:
+        milliseconds = (log["timestamp"] - EPOCH) // timedelta(milliseconds=1)
+        raw = milliseconds.to_bytes(8, "big", signed=True) + raw
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def page_after(cursor, sort):
+    """Returns the filter for logs after `cursor` in `sort` order, raising ValueError if invalid."""
+    if sort is ID_SORT:
+        return {"_id": {"$lt": decode_cursor(cursor)}}
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        if len(raw) != 20:
+            raise ValueError("Invalid cursor")
+        timestamp = EPOCH + timedelta(milliseconds=int.from_bytes(raw[:8], "big", signed=True))
+        object_id = ObjectId(raw[8:])
+    except (InvalidId, TypeError, ValueError, OverflowError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    return {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": object_id}},
+    ]}
+
+def encode_sequence(seq):
+    """Encodes a seq as an opaque ?since= token."""
+    return base64.urlsafe_b64encode(seq.to_bytes(8, "big")).decode("ascii")
+
+def decode_sequence(token):
+    """Decodes a token produced by encode_sequence, raising ValueError if invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode("ascii"))
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid since") from exc
+    if len(raw) != 8:
+        raise ValueError("Invalid since")
+    return int.from_bytes(raw, "big")
+
+def decode_cursor(cursor):
+    """Decodes an _id page cursor, raising ValueError if invalid."""
+    try:
+        return ObjectId(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (InvalidId, TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+def parse_page_size(value):
+    """Parses the requested page size, clamped to MAX_PAGE_SIZE."""
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("Invalid limit")
+    if limit < 1:
+        raise ValueError("Invalid limit")
+    return min(limit, MAX_PAGE_SIZE)
+
+@bp.route("/log", methods=["POST"])
+def access_check():
+    """
+    Logs access attempts.
+
+    The card holder is identified by `matric` or, for readers that only
+    know the card UID, by `tag`.
+    """
+    with span("parse"):
+        data = request.json
+        identity = scan_identity(data) if isinstance(data, dict) else None
+        if identity is None:
+            return jsonify({"error": "Missing matric or tag"}), 400
+
+        try:
+            timestamp = parse_timestamp(data["timestamp"]) if data.get("timestamp") else datetime.utcnow()
+        except ValueError:
+            return jsonify({"error": "Invalid timestamp"}), 400
+        try:
+            Status, reader, door = scan_labels(data)
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+
+    try:
+        with span("users"):
+            user = find_user(*identity, cached_only=mongo_down())
+    except PyMongoError:
+        # Can't decide without the directory, but keep a record of the scan
+        logger.warning("User lookup failed for %s=%s", *identity, exc_info=True)
+        write_log(build_log_entry(None, identity, Status, timestamp, reader, door))
+        return jsonify({"error": "User directory unavailable"}), 503
+
+    log_entry = build_log_entry(user, identity, Status, timestamp, reader, door)
+    access_decisions.inc("granted" if user else "denied")
+
+    # With the background writer this only queues the entry; LOG_WRITER_ASYNC=0
+    # puts the Data insert itself in this span
+    with span("write"):
+        if scan_debouncer is None:
+            write_log(log_entry)
+            first_report = True
+        else:
+            # Held until its window closes; repeats only bump its repeat_count
+            first_report = not scan_debouncer.offer(scan_key(log_entry), log_entry)
+    if first_report:
+        with span("publish"):
+            publish_scan(log_entry, user is not None)
+
+    with span("encode"):
+        response = jsonify({"message": "Access granted" if user else "Access denied"})
+    return response, 200 if user else 403
+
+
+@bp.route("/log/batch", methods=["POST"])
+def access_check_batch():
+    """
+    Logs a buffered list of scans uploaded by a reader after reconnecting.
+
+    Expects a JSON array of objects shaped like the /log body. All matrics
+    (and tags) are resolved with one Users query each and all entries are
+    written with one bulk insert. Returns one result per scan, in request
+    order.
+    """
+    scans = request.json
+    if not isinstance(scans, list):
+        return jsonify({"error": "Expected a list of scans"}), 400
+    if len(scans) > MAX_BATCH_SCANS:
+        return jsonify({"error": f"Too many scans, max {MAX_BATCH_SCANS}"}), 413
+
+    identities = [scan_identity(scan) if isinstance(scan, dict) else None for scan in scans]
+    try:
+        users = find_users((identity for identity in identities if identity is not None), mongo_down())
+    except PyMongoError:
+        # The reader still has its buffer and can upload it again later
+        logger.warning("User lookup failed for a batch of %d scans", len(scans), exc_info=True)
+        return jsonify({"error": "User directory unavailable"}), 503
+
+    results = []
+    log_entries = []
+    granted = {}
+    for scan, identity in zip(scans, identities):
+        if identity is None:
+            results.append({"status": 400, "error": "Missing matric or tag"})
+            continue
+
+        try:
+            timestamp = parse_timestamp(scan["timestamp"]) if scan.get("timestamp") else datetime.utcnow()
+        except ValueError:
+            results.append({"status": 400, "error": "Invalid timestamp"})
+            continue
+        try:
+            status, reader, door = scan_labels(scan)
+        except ValueError as exc:
+            results.append({"status": 400, "error": str(exc)})
+            continue
+
+        user = users[identity]
+        log_entries.append(build_log_entry(user, identity, status, timestamp, reader, door))
+        granted[id(log_entries[-1])] = user is not None
+        access_decisions.inc("granted" if user else "denied")
+        results.append({
+            "status": 200 if user else 403,
+            "message": "Access granted" if user else "Access denied"
+        })
+
+    if DEDUP_WINDOW > 0:
+        log_entries = collapse_repeats(log_entries, DEDUP_WINDOW, scan_key)
+    for log_entry in log_entries:
+        publish_scan(log_entry, granted[id(log_entry)])
+    if log_entries:
+        store_logs(log_entries)
+
+    return jsonify({"results": results}), 200
+
+
+@bp.route('/gt_logs', methods=['GET'])
 def get_events():
+    """
+    Returns access logs newest first, one page at a time.
+
+    Pages are keyset-paginated on `_id` (ObjectIds grow with insertion time),
+    so every page is an index seek on the default `_id` index regardless of
+    how deep the client has paged. Pass the `next` value back as `?cursor=`
+    to fetch the following page; `next` is null on the last page.
+
+    `?stream=ndjson` or `?stream=json` instead streams every log in one
+    response, walking the cursor in EXPORT_BATCH_SIZE batches.
+
+    `?fields=Matric,timestamp` limits the returned fields to a subset of
+    LOG_FIELDS; the selection is pushed to MongoDB as a projection.
+
+    `?from=` and `?to=` restrict results to a timestamp range. Such pages
+    are ordered and keyset-paginated on (timestamp, _id) instead, so each one
+    is a seek on the timestamp_id index however wide the range is. With
+    LOG_STORAGE=timeseries every page is, as Data has no _id index then.
+
+    Responses carry an ETag; polls with a matching If-None-Match get a 304
+    without any logs being read.
+
+    `?since=<token>` returns only logs stored after the token, in the order
+    they were stored, plus a new `since` token to send next time. First
+    pages include a `since` token for the newest log; an empty `since=`
+    starts from the oldest log. Logs show up there SINCE_LAG seconds after
+    they are stored. Add `?wait=N` to long-poll up to N seconds for new logs.
+    """
     db = get_db()
     logs_collection = db["Data"]
-    logs = logs_collection.find()  # Find all documents in the collection
-
-    logs_list = [
-        {
-            'tag': log.get('tag'),
-            'Name': log.get('Name'),
-            'Matric': log.get('Matric'),
-            'timestamp': log.get('timestamp')
-        } for log in logs  # Iterate over each 'log' document
-    ]
-    
-    return jsonify(logs_list)
+
+    with span("etag"):
+        visible = visible_sequence(logs_collection)
+        etag = logs_etag(logs_collection, visible)
+    if request.if_none_match.contains(etag) and not request.args.get("wait"):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    try:
+        fields = parse_fields(request.args.get("fields"))
+        query = time_range_query(request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    stream = request.args.get("stream")
+    if stream is not None:
+        if stream not in STREAM_MIMETYPES:
+            return jsonify({"error": "Invalid stream format"}), 400
+        logs = logs_collection.find(query, log_projection(fields)).sort(page_sort(query)).batch_size(EXPORT_BATCH_SIZE)
+        response = Response(
+            stream_with_context(stream_logs(logs, stream, fields)),
+            mimetype=STREAM_MIMETYPES[stream]
+        )
+        response.set_etag(etag)
+        return response
+
+    try:
+        limit = parse_page_size(request.args.get("limit"))
+        sort = page_sort(query)
+        cursor = request.args.get("cursor")
+        if cursor:
+            query.update(page_after(cursor, sort))
+        since = request.args.get("since")
+        if since is not None:
+            since = decode_sequence(since) if since else 0
+        wait = parse_wait(request.args.get("wait"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    if since is not None:
+        projection = dict(log_projection(fields), seq=1)
+        with span("query"):
+            logs = fetch_since(logs_collection, query, projection, since, limit + 1, wait)
+        has_more = len(logs) > limit
+        logs = logs[:limit]
+        with span("serialize"):
+            logs_list = [serialize_log(log, fields) for log in logs]
+        with span("encode"):
+            response = jsonify({
+                "logs": logs_list,
+                "since": encode_sequence(logs[-1]["seq"] if logs else since),
+                "more": has_more
+            })
+        # A long poll may have returned new logs, so the earlier ETag is stale
+        response.set_etag(logs_etag(logs_collection, visible_sequence(logs_collection)) if wait else etag)
+        return response
+
+    # Fetch one extra document to find out whether another page exists
+    projection = page_projection(fields, sort)
+    with span("query"):
+        logs = list(logs_collection.find(query, projection).sort(sort).limit(limit + 1))
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+
+    with span("serialize"):
+        logs_list = [serialize_log(log, fields) for log in logs]
+
+    with span("encode"):
+        response = jsonify({
+            "logs": logs_list,
+            "next": encode_page_cursor(logs[-1], sort) if has_more else None,
+            "since": encode_sequence(visible) if not cursor else None
+        })
+    response.set_etag(etag)
+    return response
+
+@bp.route("/export/csv", methods=["GET"])
+def export_csv():
+    """
+    Streams access logs as CSV straight from the Data cursor.
+
+    Filters: `?from=`, `?to=`, `?matric=`, `?status=`; `?fields=` picks columns.
+    """
+    try:
+        fields = parse_fields(request.args.get("fields"))
+        query = export_filter(request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    logs = get_db()["Data"].find(query, log_projection(fields)).sort("timestamp", ASCENDING).batch_size(EXPORT_BATCH_SIZE)
+    return Response(
+        stream_with_context(iter_csv(logs, fields)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=access_logs.csv"}
+    )
+
+@bp.route("/export/jobs", methods=["POST"])
+def create_export_job():
+    """
+    Starts a background export to local disk.
+
+    Body: {"format": "csv" | "parquet" | "arrow", "from", "to", "matric",
+    "status", "fields"}, as strings with the same meaning as the /export/csv
+    query arguments; `fields` may also be a list. Columnar formats are written
+    in record batches.
+    """
+    body = request.json or {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    fmt = body.get("format", "csv")
+    if not isinstance(fmt, str) or fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Invalid format"}), 400
+    if fmt in COLUMNAR_FORMATS and pa is None:
+        return jsonify({"error": "pyarrow is not installed"}), 501
+
+    filters = {key: body[key] for key in ("from", "to", "matric", "status") if body.get(key)}
+    # Anything but a string would reach the Data filter as a query operator
+    invalid = [key for key, value in filters.items() if not isinstance(value, str)]
+    if invalid:
+        return jsonify({"error": "Invalid " + ", ".join(invalid)}), 400
+    try:
+        fields = parse_fields(body.get("fields"))
+        query = export_filter(filters)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    projection = log_projection(fields)
+    db = get_db()
+    job = export_jobs.submit(
+        lambda: db["Data"].find(query, projection).sort("timestamp", ASCENDING).batch_size(EXPORT_RECORD_BATCH_ROWS),
+        fields,
+        fmt,
+        filters
+    )
+    return jsonify(job), 202
+
+@bp.route("/export/jobs/<job_id>", methods=["GET"])
+def get_export_job(job_id):
+    """Reports the state of a background export."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown export"}), 404
+    return jsonify(job)
+
+@bp.route("/export/jobs/<job_id>/download", methods=["GET"])
+def download_export(job_id):
+    """Serves the file written by a finished export."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown export"}), 404
+    if job["state"] != "done":
+        return jsonify({"error": "Export not finished", "state": job["state"]}), 409
+    path = os.path.abspath(export_jobs.output_path(job))
+    return send_file(path, as_attachment=True, download_name="access_logs" + EXPORT_FORMATS[job["format"]])
+
+@bp.route("/stats", methods=["GET"])
+def get_stats():
+    """
+    Answers attendance questions from the pre-aggregated rollup collections.
+
+    `?period=hour|day` (default day) picks the bucket size; `?from=` and
+    `?to=` bound the bucket start times (default: the current bucket).
+    `?matric=`, `?status=` and `?reader=` filter the counts.
+    """
+    period = request.args.get("period", "day")
+    if period not in PERIODS:
+        return jsonify({"error": "Invalid period"}), 400
+
+    try:
+        now = datetime.utcnow()
+        start = parse_timestamp(request.args["from"]) if request.args.get("from") else period_start(now, period)
+        if request.args.get("to"):
+            end = parse_timestamp(request.args["to"])
+        else:
+            end = period_start(now, period) + timedelta(hours=1 if period == "hour" else 24)
+    except ValueError:
+        return jsonify({"error": "Invalid timestamp"}), 400
+
+    filters = {}
+    for arg, field in (("matric", "Matric"), ("status", "Status"), ("reader", "reader")):
+        if arg in request.args:
+            filters[field] = request.args[arg]
+
+    stats = summarize(get_db(), period, start, end, filters)
+    stats.update({"period": period, "from": format_timestamp(start), "to": format_timestamp(end)})
+    return jsonify(stats)
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if SERVER_TIMING:
+        g.span_timer = SpanTimer()
+    g.profile = request_profiler.start(request.headers)
+
+@bp.after_app_request
+def record_request_metrics(response):
+    """Records latency and payload sizes per route template, so ids don't explode the label set."""
+    elapsed = time.perf_counter() - g.request_started
+    if g.profile is not None:
+        request_profiler.finish(g.profile, request.endpoint or "unmatched")
+    if g.get("span_timer") is not None:
+        response.headers["Server-Timing"] = g.span_timer.header(total=elapsed)
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    request_seconds.observe(elapsed, route, request.method, str(response.status_code))
+    if request.content_length is not None:
+        request_bytes.observe(request.content_length, route)
+    if not response.is_streamed:
+        response_bytes.observe(response.content_length or 0, route)
+    return response
+
+@bp.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Exposes this process's metrics in the Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@bp.route("/cache/users", methods=["GET"])
+def user_cache_stats():
+    """Reports user cache hit/miss counters."""
+    return jsonify(user_cache.stats())
+
+@socketio.on("subscribe", namespace=EVENTS_NAMESPACE)
+def subscribe(data=None):
+    """
+    Joins the rooms for a reader and/or door, e.g. {"reader": "lab-1"}.
+    With no reader or door the client receives every scan.
+    """
+    data = data if isinstance(data, dict) else {}
+    for room in event_rooms(data.get("reader"), data.get("door"))[1:] or ["all"]:
+        join_room(room)
+
+@socketio.on("unsubscribe", namespace=EVENTS_NAMESPACE)
+def unsubscribe(data=None):
+    """Leaves rooms joined with subscribe."""
+    data = data if isinstance(data, dict) else {}
+    for room in event_rooms(data.get("reader"), data.get("door"))[1:] or ["all"]:
+        leave_room(room)
+
+@bp.cli.command("indexes")
+@click.option("--check", is_flag=True, help="Only report missing or conflicting indexes and COLLSCAN queries.")
+@click.option("--replace-conflicting", is_flag=True, help="Drop indexes whose options differ and recreate them.")
+def indexes_command(check, replace_conflicting):
+    """Creates and verifies the indexes; exits 1 if any are missing or conflicting, or a query COLLSCANs."""
+    status = run_indexes(get_db(), check, replace_conflicting, report=click.echo)
+    if status:
+        click.get_current_context().exit(status)
+
+def ensure_timeseries_storage(db=None):
+    """
+    Creates Data as a time-series collection before any insert would create
+    it as a regular one; raises RuntimeError if it already is a regular one.
+    """
+    if db is not None:
+        create_timeseries_collection(db)
+        return
+    # A throwaway client, so none is left open for gunicorn to fork
+    client = MongoClient(os.environ["DATABASE_URL"], **mongo_client_options())
+    try:
+        create_timeseries_collection(client.get_database())
+    finally:
+        client.close()
+
+def create_app(db=None):
+    """
+    Builds the Flask app.
+
+    `db` replaces the MongoDB connection, e.g. with a test or benchmark
+    database; otherwise DATABASE_URL must be set, and each process connects
+    on its first query. With LOG_STORAGE=timeseries, Data is created as a
+    time-series collection first.
+    """
+    global _injected_db
+    if db is None and not os.getenv("DATABASE_URL"):
+        raise ValueError("Missing DATABASE_URL environment variable")
+    _injected_db = db
+    if LOG_STORAGE == "timeseries":
+        ensure_timeseries_storage(db)
+
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    CORS(app)
+    app.register_blueprint(bp)
+    # The async mode must match the server's worker class (gunicorn.conf.py
+    # sets it); several workers need a message queue to share events
+    socketio.init_app(
+        app,
+        cors_allowed_origins="*",
+        async_mode=os.getenv("SOCKETIO_ASYNC_MODE") or None,
+        message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE") or None
+    )
+    return app
 
 if __name__ == "__main__":
-    app.run(debug=True)  # Run the app in debug mode
+    app = create_app()
+    ensure_indexes(get_db())
+    # Development server with the debugger; production runs under gunicorn.conf.py
+    socketio.run(app, debug=True)
@@ -0,0 +1,79 @@
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from dotenv import load_dotenv
+from timestamps import parse_timestamp
+import argparse
+import os
+import sys
+
+# Progress is checkpointed here so an interrupted run resumes where it stopped
+CHECKPOINT_COLLECTION = "Migrations"
+CHECKPOINT_ID = "timestamps_to_dates"
+
+
+def migrate_timestamps(db, batch_size=1000, restart=False, report=print):
+    """
+    Converts string timestamps in Data to BSON dates in place, in _id order.
+
+    Each batch is one bulk write, and the last _id seen is stored in the
+    Migrations collection afterwards. Strings that can't be parsed are left
+    untouched and counted. Returns (converted, unparseable).
+    """
+    logs_collection = db["Data"]
+    checkpoints = db[CHECKPOINT_COLLECTION]
+    if restart:
+        checkpoints.delete_one({"_id": CHECKPOINT_ID})
+
+    checkpoint = checkpoints.find_one({"_id": CHECKPOINT_ID}) or {}
+    last_id = checkpoint.get("last_id")
+    converted = checkpoint.get("converted", 0)
+    unparseable = checkpoint.get("unparseable", 0)
+
+    while True:
+        query = {"timestamp": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(logs_collection.find(query, {"timestamp": 1}).sort("_id", ASCENDING).limit(batch_size))
+        if not batch:
+            break
+
+        updates = []
+        for log in batch:
+            try:
+                parsed = parse_timestamp(log["timestamp"])
+            except ValueError:
+                unparseable += 1
+                continue
+            # Matching on the old value keeps a concurrent rewrite from being clobbered
+            updates.append(UpdateOne(
+                {"_id": log["_id"], "timestamp": log["timestamp"]},
+                {"$set": {"timestamp": parsed}}
+            ))
+        if updates:
+            converted += logs_collection.bulk_write(updates, ordered=False).modified_count
+
+        last_id = batch[-1]["_id"]
+        checkpoints.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {"last_id": last_id, "converted": converted, "unparseable": unparseable}},
+            upsert=True
+        )
+        report(f"Converted {converted} timestamps so far ({unparseable} unparseable), last _id {last_id}")
+
+    return converted, unparseable
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert string timestamps in Data to BSON dates.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="ignore any saved checkpoint")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = MongoClient(os.environ["DATABASE_URL"]).get_database()
+    converted, unparseable = migrate_timestamps(db, args.batch_size, args.restart)
+    print(f"Done: {converted} converted, {unparseable} unparseable")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+from datetime import datetime
+import cProfile
+import itertools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SpanTimer:
+    """Collects named phase durations for one request, for a Server-Timing header."""
+
+    def __init__(self):
+        self.spans = []
+
+    @contextmanager
+    def span(self, name):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, time.perf_counter() - began))
+
+    def header(self, total=None):
+        """Renders the spans as a Server-Timing value, durations in milliseconds."""
+        spans = self.spans + ([("total", total)] if total is not None else [])
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in spans)
+
+
+class RequestProfiler:
+    """
+    Captures cProfile stats for a sample of requests into `directory`.
+
+    Every `sample_every`-th request is profiled (0 disables sampling), as is
+    any request whose X-Profile header matches `token`. Only one request is
+    profiled at a time per process, since Python allows a single active
+    profiler; the rest run unprofiled. Load the .prof files with pstats or
+    snakeviz.
+    """
+
+    def __init__(self, directory, sample_every=0, token=None):
+        self.directory = directory
+        self.sample_every = sample_every
+        self.token = token
+        self._counter = itertools.count(1)
+        self._busy = threading.Lock()
+
+    def start(self, headers):
+        """Starts profiling the current request if it is sampled; returns the profile or None."""
+        sampled = self.sample_every > 0 and next(self._counter) % self.sample_every == 0
+        requested = self.token is not None and headers.get("X-Profile") == self.token
+        if not (sampled or requested) or not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) already owns the hook
+            self._busy.release()
+            return None
+        return profile
+
+    def finish(self, profile, name):
+        """Stops `profile` and writes it out as <time>-<name>-<pid>.prof."""
+        profile.disable()
+        self._busy.release()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{name}-{os.getpid()}.prof")
+            profile.dump_stats(path)
+            return path
+        except OSError:
+            logger.exception("Failed to write request profile")
+            return None
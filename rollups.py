@@ -0,0 +1,173 @@
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
+from dotenv import load_dotenv
+from indexes import INDEXES
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import os
+import sys
+
+ROLLUP_COLLECTION = "Rollups"
+PERIODS = ("hour", "day")
+
+# Dimensions every rollup document is counted by, besides period and start;
+# keep in sync with the Rollups index in indexes.py
+DIMENSIONS = ("Matric", "Status", "reader")
+
+# The same counts without Matric, so stats that aren't for one card holder
+# read a few documents per bucket rather than one per card holder
+TOTALS_COLLECTION = "RollupTotals"
+TOTAL_DIMENSIONS = ("Status", "reader")
+
+
+def period_start(timestamp, period):
+    """Truncates a timestamp to the start of its hour or day."""
+    if period == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rollup_updates(entries, dimensions=DIMENSIONS):
+    """Collapses log entries into one $inc upsert per (period, start, *dimensions)."""
+    counts = Counter()
+    for entry in entries:
+        timestamp = entry.get("timestamp")
+        # Legacy string timestamps can't be bucketed reliably
+        if not isinstance(timestamp, datetime):
+            continue
+        values = tuple(entry.get(field) for field in dimensions)
+        for period in PERIODS:
+            counts[(period, period_start(timestamp, period)) + values] += 1
+
+    return [
+        UpdateOne(
+            dict(zip(("period", "start") + dimensions, key)),
+            {"$inc": {"count": count}},
+            upsert=True
+        )
+        for key, count in counts.items()
+    ]
+
+
+def update_rollups(db, entries):
+    """Applies the rollup and total increments for freshly inserted log entries."""
+    for collection, dimensions in ((ROLLUP_COLLECTION, DIMENSIONS), (TOTALS_COLLECTION, TOTAL_DIMENSIONS)):
+        updates = rollup_updates(entries, dimensions)
+        if updates:
+            db[collection].bulk_write(updates, ordered=False)
+
+
+def summarize(db, period, start, end, filters=None):
+    """
+    Sums rollup counts for buckets starting in [start, end).
+
+    Reads only rollup documents, so the cost depends on the number of
+    buckets and distinct dimension values, not on the size of Data. The
+    sums are grouped on the server; without a Matric filter they come from
+    RollupTotals, and only the distinct Matric count reads Rollups.
+    """
+    filters = filters or {}
+    query = {"period": period, "start": {"$gte": start, "$lt": end}}
+    query.update(filters)
+    source = ROLLUP_COLLECTION if "Matric" in filters else TOTALS_COLLECTION
+
+    total = 0
+    by_status = Counter()
+    by_reader = Counter()
+    for group in db[source].aggregate([
+        {"$match": query},
+        {"$group": {"_id": {"Status": "$Status", "reader": "$reader"}, "count": {"$sum": "$count"}}},
+    ]):
+        total += group["count"]
+        by_status[str(group["_id"].get("Status"))] += group["count"]
+        by_reader[str(group["_id"].get("reader"))] += group["count"]
+
+    unique = list(db[ROLLUP_COLLECTION].aggregate([
+        {"$match": query},
+        # Unknown cards have no Matric and aren't card holders
+        {"$match": {"Matric": {"$ne": None}}},
+        {"$group": {"_id": "$Matric"}},
+        {"$count": "matrics"},
+    ]))
+
+    return {
+        "count": total,
+        "unique_matrics": unique[0]["matrics"] if unique else 0,
+        "by_status": dict(by_status),
+        "by_reader": dict(by_reader),
+    }
+
+
+def _rebuild_chunk(db, target, dimensions, start, end):
+    """Aggregates one [start, end) slice of Data into the target collection."""
+    documents = []
+    for period in PERIODS:
+        pipeline = [
+            {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+            {"$group": {
+                "_id": {
+                    "start": {"$dateTrunc": {"date": "$timestamp", "unit": period}},
+                    **{field: {"$ifNull": ["$" + field, None]} for field in dimensions},
+                },
+                "count": {"$sum": 1},
+            }},
+        ]
+        for group in db["Data"].aggregate(pipeline, allowDiskUse=True):
+            documents.append({"period": period, **group["_id"], "count": group["count"]})
+    if documents:
+        db[target].insert_many(documents, ordered=False)
+    return len(documents)
+
+
+def rebuild_rollups(db, workers=4, chunk_days=1, report=print):
+    """
+    Recomputes Rollups and RollupTotals from Data in parallel day-aligned chunks.
+
+    Results go to scratch collections that then replace the live ones, so
+    readers never see a half-built table. Scans ingested while a rebuild
+    runs are counted in the old tables only; rebuild during a quiet period.
+    """
+    first = db["Data"].find_one({"timestamp": {"$type": "date"}}, sort=[("timestamp", ASCENDING)])
+    last = db["Data"].find_one({"timestamp": {"$type": "date"}}, sort=[("timestamp", DESCENDING)])
+    tables = ((ROLLUP_COLLECTION, DIMENSIONS), (TOTALS_COLLECTION, TOTAL_DIMENSIONS))
+    for name, _ in tables:
+        db[name + "_rebuild"].drop()
+    if not first:
+        for name, _ in tables:
+            db[name].delete_many({})
+        return 0
+
+    # Chunks are whole days so no hour or day bucket spans two chunks
+    chunks = []
+    start = period_start(first["timestamp"], "day")
+    while start <= last["timestamp"]:
+        chunks.append((start, start + timedelta(days=chunk_days)))
+        start += timedelta(days=chunk_days)
+
+    written = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, dimensions in tables:
+            target = name + "_rebuild"
+            written += sum(pool.map(lambda chunk: _rebuild_chunk(db, target, dimensions, *chunk), chunks))
+            db[target].create_indexes(INDEXES[name])
+    for name, _ in tables:
+        db[name + "_rebuild"].rename(name, dropTarget=True)
+    report(f"Rebuilt {written} rollup documents from {len(chunks)} chunks")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the Rollups and RollupTotals collections from Data.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-days", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = MongoClient(os.environ["DATABASE_URL"]).get_database()
+    rebuild_rollups(db, args.workers, args.chunk_days)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
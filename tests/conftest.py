@@ -0,0 +1,46 @@
+import os
+import sys
+
+import mongomock
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _create_indexes(self, indexes, session=None):
+    # mongomock's create_indexes drops partialFilterExpression; create_index keeps it
+    return [
+        self.create_index(list(index.document["key"].items()), **{
+            option: value for option, value in index.document.items() if option != "key"
+        })
+        for index in indexes
+    ]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(mongomock.collection.Collection, "create_indexes", _create_indexes)
+    return mongomock.MongoClient().get_database("rfid_test")
+
+
+@pytest.fixture
+def app_module(monkeypatch, tmp_path):
+    # main reads its settings at import; these keep it in-process and synchronous
+    for name, value in {
+        "USER_CACHE_WATCH": "0",
+        "LOG_WRITER_ASYNC": "0",
+        "DEDUP_WINDOW": "0",
+        "ROLLUPS_ENABLED": "0",
+    }.items():
+        monkeypatch.setenv(name, value)
+    import main
+    monkeypatch.setattr(main, "JOURNAL_DIR", str(tmp_path / "journal"))
+    monkeypatch.setattr(main, "_journal_pid", None)
+    monkeypatch.setattr(main, "_mongo_failed_at", None)
+    return main
+
+
+@pytest.fixture
+def client(app_module, db):
+    return app_module.create_app(db).test_client()
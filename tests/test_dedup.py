@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from dedup import ScanDebouncer, collapse_repeats
+
+BASE = datetime(2026, 1, 1)
+
+
+def test_repeats_within_the_window_fold_into_the_first_report():
+    emitted = []
+    debouncer = ScanDebouncer(2, emitted.append)
+    first = {"Matric": "M1"}
+
+    assert debouncer.offer(("M1", "r1"), first, now=11.0) is False
+    # Within 2s of the first report, though in the next bucket
+    assert debouncer.offer(("M1", "r1"), {"Matric": "M1"}, now=12.5) is True
+    assert debouncer.offer(("M1", "r2"), {"Matric": "M1"}, now=12.5) is False
+    assert debouncer.offer(("M1", "r1"), {"Matric": "M1"}, now=13.5) is False
+    debouncer.close()
+
+    assert first["repeat_count"] == 2
+    assert [entry["repeat_count"] for entry in emitted] == [2, 1, 1]
+
+
+def test_entries_are_emitted_once_their_window_can_take_no_repeats():
+    emitted = []
+    debouncer = ScanDebouncer(2, emitted.append)
+    debouncer.offer(("M1", "r1"), {"Matric": "M1"}, now=10.0)
+
+    debouncer.flush(now=11.0)
+    assert emitted == []
+    debouncer.flush(now=14.0)
+    assert [entry["Matric"] for entry in emitted] == ["M1"]
+    debouncer.close()
+    assert len(emitted) == 1
+
+
+def test_collapse_repeats_uses_scan_timestamps():
+    entries = [
+        {"Matric": "M1", "timestamp": BASE},
+        {"Matric": "M2", "timestamp": BASE},
+        {"Matric": "M1", "timestamp": BASE + timedelta(seconds=1)},
+        {"Matric": "M1", "timestamp": BASE + timedelta(seconds=5)},
+    ]
+
+    kept = collapse_repeats(entries, 2, lambda entry: entry["Matric"])
+
+    assert [(entry["Matric"], entry["repeat_count"]) for entry in kept] == [("M1", 2), ("M2", 1), ("M1", 1)]
@@ -0,0 +1,24 @@
+import json
+
+
+def test_export_job_accepts_a_list_of_fields(app_module, client, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module.export_jobs, "directory", str(tmp_path))
+    response = client.post("/export/jobs", json={"fields": ["Matric", "timestamp"]})
+
+    assert response.status_code == 202
+    assert response.get_json()["fields"] == ["Matric", "timestamp"]
+
+
+def test_export_job_rejects_bad_bodies(client):
+    assert client.post("/export/jobs", json=["Matric"]).status_code == 400
+    assert client.post("/export/jobs", json={"fields": ["Matric", 1]}).status_code == 400
+    assert client.post("/export/jobs", json={"fields": ["Password"]}).status_code == 400
+
+
+def test_export_job_rejects_non_string_filters(client):
+    assert client.post("/export/jobs", json={"matric": {"$ne": None}}).status_code == 400
+    # Beyond what the JSON encoder (and so the job record) can hold
+    body = json.dumps({"status": 2 ** 70})
+    assert client.post("/export/jobs", data=body, content_type="application/json").status_code == 400
+    assert client.post("/export/jobs", json={"from": ["2026-01-01"]}).status_code == 400
+    assert client.post("/export/jobs", json={"format": ["csv"]}).status_code == 400
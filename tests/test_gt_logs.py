@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+import time
+
+BASE = datetime(2026, 1, 1)
+
+
+def insert_logs(db, count):
+    # Three scans share each second, so pages must break timestamp ties by _id
+    db["Data"].insert_many([
+        {"tag": None, "Name": "n", "Matric": f"M{i}", "Status": "in", "timestamp": BASE + timedelta(seconds=i // 3)}
+        for i in range(count)
+    ])
+
+
+def scan(matric):
+    return {"tag": None, "Name": "n", "Matric": matric, "Status": "in", "timestamp": datetime.utcnow()}
+
+
+def test_time_range_pages_walk_every_log_once_newest_first(client, db):
+    insert_logs(db, 30)
+    seen = []
+    cursor = None
+    while True:
+        url = "/gt_logs?limit=4&fields=Matric,timestamp&from=2026-01-01T00:00:02&to=2026-01-01T00:00:08"
+        page = client.get(url + (f"&cursor={cursor}" if cursor else "")).get_json()
+        seen.extend(page["logs"])
+        cursor = page["next"]
+        if cursor is None:
+            break
+
+    assert [log["Matric"] for log in seen] == [f"M{i}" for i in range(23, 5, -1)]
+
+
+def test_range_cursor_rejects_an_id_cursor(client, db):
+    insert_logs(db, 10)
+    next_cursor = client.get("/gt_logs?limit=2").get_json()["next"]
+
+    assert client.get(f"/gt_logs?from=2026-01-01&cursor={next_cursor}").status_code == 400
+
+
+def test_since_waits_for_a_batch_numbered_earlier_that_lands_later(app_module, client, db, monkeypatch):
+    monkeypatch.setattr(app_module, "SINCE_LAG", 0.3)
+    since = client.get("/gt_logs").get_json()["since"]
+
+    # Writer A numbers its batch, then writer B numbers and stores one before A's insert lands
+    slow = [scan("A")]
+    app_module.stamp_sequence(slow)
+    app_module.insert_logs([scan("B")])
+    assert client.get(f"/gt_logs?since={since}").get_json()["logs"] == []
+
+    app_module.insert_data(db["Data"], slow)
+    time.sleep(0.35)
+    page = client.get(f"/gt_logs?since={since}&fields=Matric").get_json()
+    assert [log["Matric"] for log in page["logs"]] == ["A", "B"]
+    assert client.get(f"/gt_logs?since={page['since']}").get_json()["logs"] == []
+
+
+def test_replayed_entries_are_numbered_when_stored(app_module, client, db):
+    app_module.insert_logs([scan("A")])
+    # Numbered by an insert that failed and was journaled
+    journaled = [scan("B")]
+    app_module.stamp_sequence(journaled)
+    app_module.insert_logs([scan("C")])
+    app_module.insert_logs(journaled)
+
+    assert [log["Matric"] for log in db["Data"].find().sort("seq", 1)] == ["A", "C", "B"]
+
+
+def test_etag_changes_when_any_worker_stores_logs(app_module, client, db):
+    app_module.insert_logs([scan("A")])
+    etag = client.get("/gt_logs").headers["ETag"]
+    assert client.get("/gt_logs", headers={"If-None-Match": etag}).status_code == 304
+
+    # Another worker's insert (or journal replay) only shows up in the shared counter
+    db["Counters"].update_one({"_id": app_module.SEQUENCE_COUNTER}, {"$inc": {"stored": 1}})
+    assert client.get("/gt_logs", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_timeseries_storage_always_pages_on_timestamp(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "LOG_STORAGE", "timeseries")
+
+    assert app_module.page_sort({}) is app_module.TIMESTAMP_SORT
+
+
+def test_since_lag_is_measured_on_the_database_clock(app_module, client, db, monkeypatch):
+    monkeypatch.setattr(app_module, "SINCE_LAG", 0.3)
+    monkeypatch.setattr(app_module, "_server_clock", None)
+
+    class AheadClock(datetime):
+        # This host's clock runs well ahead of the database's
+        @classmethod
+        def utcnow(cls):
+            return datetime.utcnow() + timedelta(seconds=30)
+
+    monkeypatch.setattr(app_module, "datetime", AheadClock)
+    since = client.get("/gt_logs").get_json()["since"]
+    app_module.insert_logs([scan("A")])
+    assert client.get(f"/gt_logs?since={since}").get_json()["logs"] == []
+
+    time.sleep(0.35)
+    assert len(client.get(f"/gt_logs?since={since}").get_json()["logs"]) == 1
@@ -0,0 +1,51 @@
+from pymongo import ASCENDING
+
+from indexes import conflicting_indexes, ensure_indexes, missing_indexes
+
+
+def test_ensure_indexes_is_idempotent(db):
+    assert "Matric_unique" in ensure_indexes(db)
+    assert ensure_indexes(db) == []
+    assert missing_indexes(db) == []
+    assert conflicting_indexes(db) == []
+
+
+def test_plain_index_on_same_keys_is_reported_not_accepted(db):
+    db["Users"].create_index([("Matric", ASCENDING)])
+
+    created = ensure_indexes(db)
+
+    assert "Matric_unique" not in created
+    assert conflicting_indexes(db) == ["Users.Matric_unique (conflicts with Matric_1)"]
+    assert not db["Users"].index_information()["Matric_1"].get("unique")
+
+
+def test_replace_conflicting_recreates_with_the_right_options(db):
+    db["Users"].create_index([("Matric", ASCENDING)])
+
+    assert "Matric_unique" in ensure_indexes(db, replace_conflicting=True)
+
+    indexes = db["Users"].index_information()
+    assert "Matric_1" not in indexes
+    assert indexes["Matric_unique"]["unique"]
+    assert conflicting_indexes(db) == []
+
+
+def test_partial_filter_mismatch_conflicts(db):
+    db["Users"].create_index([("tag", ASCENDING)], unique=True)
+
+    ensure_indexes(db)
+
+    assert conflicting_indexes(db) == ["Users.tag_unique (conflicts with tag_1)"]
+
+
+def test_flask_indexes_command_fails_on_problems(app_module, db, monkeypatch):
+    runner = app_module.create_app(db).test_cli_runner()
+    report = {"missing": [], "conflicting": [], "collscans": []}
+    monkeypatch.setattr("indexes.verify_indexes", lambda db: report)
+
+    assert runner.invoke(args=["indexes"]).exit_code == 0
+    report["collscans"] = ["Data: gt_logs page"]
+    result = runner.invoke(args=["indexes", "--check"])
+    assert result.exit_code == 1
+    assert "gt_logs page" in result.output
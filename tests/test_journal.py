@@ -0,0 +1,132 @@
+from datetime import datetime
+import threading
+import time
+
+from bson import ObjectId, encode
+from pymongo.errors import ServerSelectionTimeoutError
+
+from journal import Journal, iter_segment
+
+
+def scan(matric):
+    return {"_id": ObjectId(), "tag": None, "Name": "n", "Matric": matric, "Status": "in", "timestamp": datetime.utcnow()}
+
+
+def test_torn_tail_is_skipped_after_a_restart(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.append([scan("A"), scan("B")])
+    journal.close()
+    with open(journal.segments()[-1], "ab") as f:
+        f.write(encode(scan("C"))[:10])
+    # The process dies, releasing its directory to the next one
+    journal._dir_lock.close()
+
+    restarted = Journal(str(tmp_path))
+    replayed = []
+    assert restarted.has_backlog()
+    assert restarted.replay(replayed.extend) == 2
+    assert [entry["Matric"] for entry in replayed] == ["A", "B"]
+    assert not restarted.has_backlog()
+
+
+def test_tail_of_a_burst_is_synced_without_another_append(tmp_path):
+    journal = Journal(str(tmp_path), fsync_batch=1000, fsync_interval=0.05)
+    journal.append([scan("A")])
+    time.sleep(0.2)
+
+    assert journal._unsynced == 0
+    journal.close()
+
+
+def test_replay_skips_entries_that_already_landed(app_module, client, db, tmp_path):
+    landed = scan("A")
+    app_module.insert_logs([dict(landed)])
+    journal = Journal(str(tmp_path))
+    journal.append([landed, scan("B")])
+
+    journal.replay(app_module.replay_logs)
+    journal.replay(app_module.replay_logs)
+
+    assert sorted(log["Matric"] for log in db["Data"].find()) == ["A", "B"]
+    journal.close()
+
+
+def test_timeseries_replay_skips_entries_that_already_landed(app_module, client, db, monkeypatch):
+    monkeypatch.setattr(app_module, "LOG_STORAGE", "timeseries")
+    landed = scan("A")
+    app_module.insert_logs([landed])
+
+    inserted = []
+    monkeypatch.setattr(app_module, "insert_logs", inserted.extend)
+    app_module.replay_logs([dict(landed), scan("B")])
+
+    assert [entry["Matric"] for entry in inserted] == ["B"]
+
+
+def test_replay_finishes_while_appends_keep_arriving(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.append([scan("leftover")])
+    inserted = []
+
+    def slow_insert(batch):
+        time.sleep(0.01)
+        inserted.extend(batch)
+
+    def traffic():
+        for i in range(100):
+            journal.append([scan(f"M{i}")])
+            time.sleep(0.001)
+
+    appender = threading.Thread(target=traffic)
+    appender.start()
+    journal.replay(slow_insert, batch_size=1)
+    appender.join()
+    journal.replay(slow_insert, batch_size=1)
+
+    assert not journal.has_backlog()
+    assert sorted(entry["Matric"] for entry in inserted) == sorted(["leftover"] + [f"M{i}" for i in range(100)])
+    journal.close()
+
+
+def test_leftover_backlog_doesnt_stop_lookups(app_module, client, db, monkeypatch):
+    monkeypatch.setenv("JOURNAL_REPLAY_INTERVAL", "3600")
+    app_module.user_cache.invalidate()
+    db["Users"].insert_one({"Matric": "UNCACHED", "Name": "u"})
+    # What a restarted worker inherits from its predecessor
+    journal = app_module.get_journal()
+    journal.append([scan("LEFTOVER")])
+
+    assert client.post("/log", json={"matric": "UNCACHED"}).status_code == 200
+    assert [log["Matric"] for log in db["Data"].find()] == ["UNCACHED"]
+    journal.close()
+
+
+def test_recent_failure_answers_cache_misses_without_querying_users(app_module, client, db, monkeypatch):
+    monkeypatch.setenv("JOURNAL_REPLAY_INTERVAL", "3600")
+    app_module.user_cache.invalidate()
+    db["Users"].insert_many([{"Matric": "CACHED", "Name": "c"}, {"Matric": "UNCACHED", "Name": "u"}])
+    assert client.post("/log", json={"matric": "CACHED"}).status_code == 200
+
+    def unreachable(*args, **kwargs):
+        raise ServerSelectionTimeoutError("no servers")
+
+    users = db["Users"].__class__
+    find_one = users.find_one
+    monkeypatch.setattr(users, "find_one", unreachable)
+    assert client.post("/log", json={"matric": "UNCACHED"}).status_code == 503
+    # Until the retry interval passes, misses don't query at all
+    monkeypatch.setattr(users, "find_one", lambda *args, **kwargs: 1 / 0)
+    assert client.post("/log", json={"matric": "CACHED"}).status_code == 200
+    assert client.post("/log", json={"matric": "UNCACHED"}).status_code == 503
+    assert client.post("/log/batch", json=[{"matric": "UNCACHED"}]).status_code == 503
+    journal = app_module.get_journal()
+    journal.sync()
+    journaled = [entry["Matric"] for path in journal.segments() for entry in iter_segment(path)]
+    assert journaled == ["UNCACHED", "CACHED", "UNCACHED"]
+
+    # Past it, the next miss tries MongoDB again and a success ends the outage
+    monkeypatch.setattr(users, "find_one", find_one)
+    monkeypatch.setattr(app_module, "_mongo_failed_at", time.monotonic() - app_module.MONGO_RETRY_INTERVAL)
+    assert client.post("/log", json={"matric": "UNCACHED"}).status_code == 200
+    assert not app_module.mongo_down()
+    journal.close()
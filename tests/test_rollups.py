@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from rollups import ROLLUP_COLLECTION, TOTALS_COLLECTION, summarize
+
+DAY = datetime(2026, 1, 1)
+
+
+def rollup(matric, status, reader, count):
+    return {"period": "day", "start": DAY, "Matric": matric, "Status": status, "reader": reader, "count": count}
+
+
+def seed(db):
+    rollups = [
+        rollup("M1", "in", "r1", 3),
+        rollup("M2", "in", "r1", 2),
+        rollup("M2", "out", "r2", 1),
+        rollup(None, "in", "r2", 4),
+    ]
+    db[ROLLUP_COLLECTION].insert_many(rollups)
+    totals = {}
+    for document in rollups:
+        key = (document["Status"], document["reader"])
+        totals[key] = totals.get(key, 0) + document["count"]
+    db[TOTALS_COLLECTION].insert_many([
+        {"period": "day", "start": DAY, "Status": status, "reader": reader, "count": count}
+        for (status, reader), count in totals.items()
+    ])
+
+
+def test_unfiltered_summary_reads_totals(db):
+    seed(db)
+    # Totals are authoritative for the sums, so a change there must show up
+    db[TOTALS_COLLECTION].update_one({"Status": "out"}, {"$inc": {"count": 10}})
+
+    assert summarize(db, "day", DAY, datetime(2026, 1, 2)) == {
+        "count": 20,
+        "unique_matrics": 2,
+        "by_status": {"in": 9, "out": 11},
+        "by_reader": {"r1": 5, "r2": 15},
+    }
+
+
+def test_matric_filter_reads_per_card_rollups(db):
+    seed(db)
+
+    assert summarize(db, "day", DAY, datetime(2026, 1, 2), {"Matric": "M2", "reader": "r1"}) == {
+        "count": 2,
+        "unique_matrics": 1,
+        "by_status": {"in": 2},
+        "by_reader": {"r1": 2},
+    }
@@ -0,0 +1,22 @@
+import json
+
+
+def test_log_rejects_unhashable_reader_and_door(client):
+    assert client.post("/log", json={"matric": "M1", "reader": ["x"]}).get_json() == {"error": "Invalid reader"}
+    assert client.post("/log", json={"matric": "M1", "door": {"a": 1}}).status_code == 400
+
+
+def test_batch_rejects_bad_scans_one_by_one(client, db):
+    db["Users"].insert_one({"Matric": "M1", "Name": "n"})
+
+    scans = [
+        {"matric": "M1", "reader": "r1"},
+        {"matric": "M1", "reader": ["x"]},
+        {"matric": "M1", "door": {"a": 1}},
+        {"matric": "M1", "status": 2 ** 70},
+    ]
+    response = client.post("/log/batch", data=json.dumps(scans), content_type="application/json")
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.get_json()["results"]] == [200, 400, 400, 400]
+    assert [log["reader"] for log in db["Data"].find()] == ["r1"]
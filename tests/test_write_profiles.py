@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError
+
+from journal import iter_segment
+from write_profiles import WRITE_PROFILES, group_by_profile
+
+
+def test_group_by_profile_splits_on_reader():
+    entries = [{"reader": "lab-1"}, {"reader": "gate"}, {}, {"reader": 7}]
+
+    groups = group_by_profile(entries, None, {"lab-1": "fire-and-forget", 7: "durable"})
+
+    assert groups == {
+        "fire-and-forget": [{"reader": "lab-1"}],
+        None: [{"reader": "gate"}, {}],
+        "durable": [{"reader": 7}],
+    }
+
+
+def test_durable_profile_times_out():
+    assert WRITE_PROFILES["durable"].document["wtimeout"] > 0
+
+
+def test_write_concern_timeout_sends_the_batch_to_the_journal(app_module, client, db, monkeypatch):
+    def time_out(self, entries, ordered=True):
+        raise BulkWriteError({
+            "writeErrors": [],
+            "writeConcernErrors": [{"code": 64, "errmsg": "waiting for replication timed out"}],
+        })
+
+    monkeypatch.setenv("JOURNAL_REPLAY_INTERVAL", "3600")
+    monkeypatch.setattr(db["Data"].__class__, "insert_many", time_out)
+    app_module.store_logs([{"Matric": "M1", "timestamp": datetime.utcnow()}])
+
+    journal = app_module.get_journal()
+    assert journal.has_backlog()
+    journal.sync()
+    assert [entry["Matric"] for path in journal.segments() for entry in iter_segment(path)] == ["M1"]
+    journal.close()
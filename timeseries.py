@@ -0,0 +1,125 @@
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import CollectionInvalid
+from dotenv import load_dotenv
+from datetime import datetime
+import argparse
+import os
+import sys
+
+# Layout of Data when LOG_STORAGE=timeseries
+TIMESERIES_OPTIONS = {
+    "timeField": "timestamp",
+    "metaField": "meta",
+    "granularity": "seconds",
+}
+
+CHECKPOINT_COLLECTION = "Migrations"
+CHECKPOINT_ID = "data_to_timeseries"
+
+
+def log_meta(entry):
+    """
+    Builds the metaField for a log entry.
+
+    MongoDB buckets measurements by meta value, so this holds the fields that
+    repeat for a card at a reader. The top-level Matric/reader fields are kept
+    too so queries written for the plain layout keep working.
+    """
+    return {"Matric": entry.get("Matric"), "reader": entry.get("reader")}
+
+
+def is_timeseries(db, name="Data"):
+    """Returns True if the collection exists and is a time-series collection."""
+    for info in db.list_collections(filter={"name": name}):
+        return info.get("type") == "timeseries"
+    return False
+
+
+def create_timeseries_collection(db, name="Data"):
+    """Creates `name` as a time-series collection; does nothing if it already is one."""
+    if is_timeseries(db, name):
+        return False
+    try:
+        db.create_collection(name, timeseries=TIMESERIES_OPTIONS)
+    except CollectionInvalid as exc:
+        # Another worker may have created it first
+        if is_timeseries(db, name):
+            return False
+        raise RuntimeError(f"{name} already exists as a regular collection; run 'python timeseries.py migrate'") from exc
+    return True
+
+
+def migrate_to_timeseries(db, name="Data", legacy_name="Data_legacy", batch_size=1000, report=print):
+    """
+    Moves a regular log collection into a new time-series collection.
+
+    The regular collection is renamed to `legacy_name` (time-series collections
+    can't be renamed, so the new one takes over the original name), then
+    copied across in `_id` order, one insert_many per batch. The last copied
+    `_id` is checkpointed after each batch so an interrupted run resumes from
+    there. Documents whose timestamp isn't a date yet are skipped and counted;
+    run migrate_timestamps.py first. Stop the service (or point it at
+    LOG_STORAGE=timeseries) before the rename. Returns (copied, skipped).
+    """
+    if not is_timeseries(db, name) and name in db.list_collection_names():
+        db[name].rename(legacy_name)
+    create_timeseries_collection(db, name)
+
+    checkpoints = db[CHECKPOINT_COLLECTION]
+    checkpoint = checkpoints.find_one({"_id": CHECKPOINT_ID}) or {}
+    last_id = checkpoint.get("last_id")
+    copied = checkpoint.get("copied", 0)
+    skipped = checkpoint.get("skipped", 0)
+
+    source = db[legacy_name]
+    target = db[name]
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(source.find(query).sort("_id", ASCENDING).limit(batch_size))
+        if not batch:
+            break
+
+        documents = []
+        for log in batch:
+            if not isinstance(log.get("timestamp"), datetime):
+                skipped += 1
+                continue
+            log["meta"] = log_meta(log)
+            documents.append(log)
+        if documents:
+            target.insert_many(documents, ordered=False)
+            copied += len(documents)
+
+        last_id = batch[-1]["_id"]
+        checkpoints.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {"last_id": last_id, "copied": copied, "skipped": skipped}},
+            upsert=True
+        )
+        report(f"Copied {copied} logs so far ({skipped} skipped), last _id {last_id}")
+
+    return copied, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the time-series layout of the Data collection.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("create", help="create Data as a time-series collection")
+    migrate = subcommands.add_parser("migrate", help="move an existing Data collection into time-series layout")
+    migrate.add_argument("--legacy-name", default="Data_legacy")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = MongoClient(os.environ["DATABASE_URL"]).get_database()
+
+    if args.command == "create":
+        print("Created Data" if create_timeseries_collection(db) else "Data is already a time-series collection")
+    else:
+        copied, skipped = migrate_to_timeseries(db, legacy_name=args.legacy_name, batch_size=args.batch_size)
+        print(f"Done: {copied} copied, {skipped} skipped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+import threading
+
+# Formats readers are known to send, tried after datetime.fromisoformat
+TIMESTAMP_FORMATS = [
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%a, %d %b %Y %H:%M:%S GMT",
+]
+
+# Readers stick to one format, so the last one that matched is tried first
+_formats = list(TIMESTAMP_FORMATS)
+_formats_lock = threading.Lock()
+
+
+def to_utc(value):
+    """Converts an aware datetime to naive UTC, which is how BSON dates round-trip."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _parse_string(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+
+    for fmt in list(_formats):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt is not _formats[0]:
+            with _formats_lock:
+                _formats.remove(fmt)
+                _formats.insert(0, fmt)
+        return parsed
+    raise ValueError(f"Unrecognised timestamp: {value!r}")
+
+
+def parse_timestamp(value):
+    """
+    Normalises a reader-supplied timestamp to a naive UTC datetime.
+
+    Accepts datetimes, ISO 8601 and the other TIMESTAMP_FORMATS strings, and
+    Unix epochs in seconds or milliseconds. Raises ValueError otherwise.
+    """
+    if isinstance(value, datetime):
+        return to_utc(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Anything past 1e11 seconds is year 5138+, so it must be milliseconds
+        seconds = value / 1000 if abs(value) > 1e11 else value
+        try:
+            return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError) as exc:
+            raise ValueError(f"Timestamp out of range: {value!r}") from exc
+    if isinstance(value, str):
+        return to_utc(_parse_string(value.strip()))
+    raise ValueError(f"Unsupported timestamp: {value!r}")
+
+
+def format_timestamp(value):
+    """Renders stored timestamps as ISO 8601 UTC strings; legacy strings pass through."""
+    if isinstance(value, datetime):
+        return to_utc(value).isoformat() + "Z"
+    return value
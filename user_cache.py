@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from pymongo.errors import OperationFailure, PyMongoError
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Returned by UserCache.get when nothing usable is cached
+MISSING = object()
+
+
+class UserCache:
+    """
+    Bounded in-memory LRU cache of user records with per-entry TTLs.
+
+    Unknown users are cached as negative entries (value None) with their own,
+    shorter TTL so repeated scans of unregistered cards don't hit MongoDB
+    either. Safe to share between request threads.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300, negative_ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Returns the cached user (or None for a known-unknown key), else MISSING."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, user):
+        """Caches a user record, or a negative entry when user is None."""
+        ttl = self.ttl if user is not None else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drops one key, or every entry when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """Returns hit/miss counters and the current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+
+def watch_users(collection, cache, retry_delay=5):
+    """
+    Invalidates cache entries as the Users collection changes.
+
+    Uses a change stream, which needs a replica set or sharded cluster. On a
+    standalone server the watcher gives up and entries simply expire by TTL.
+    After any interruption the whole cache is dropped, since events may have
+    been missed while disconnected.
+    """
+    while True:
+        try:
+            with collection.watch(full_document="updateLookup") as stream:
+                for change in stream:
+                    user = change.get("fullDocument")
+                    updated = change.get("updateDescription", {}).get("updatedFields", {})
+                    if user and change["operationType"] in ("insert", "update") and not {"Matric", "tag"} & set(updated):
+                        cache.invalidate(("Matric", user.get("Matric")))
+                        cache.invalidate(("tag", user.get("tag")))
+                    else:
+                        # Deletes, replaces and identifier changes don't tell us
+                        # every key that went stale, so drop everything
+                        cache.invalidate()
+        except OperationFailure as exc:
+            logger.warning("Users change stream unavailable, relying on TTL expiry: %s", exc)
+            return
+        except PyMongoError as exc:
+            logger.warning("Users change stream interrupted, retrying: %s", exc)
+            cache.invalidate()
+            time.sleep(retry_delay)
+
+
+def start_users_watcher(collection, cache):
+    """Runs watch_users on a daemon thread and returns the thread."""
+    thread = threading.Thread(target=watch_users, args=(collection, cache), name="users-cache-watcher", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,51 @@
+from pymongo.write_concern import WriteConcern
+import json
+import os
+
+# How long a durable write waits for a majority before failing with a
+# write-concern timeout, so the batch goes to the local journal instead of
+# stalling the writer (and then every request) while a majority is down
+DURABLE_WTIMEOUT_MS = int(os.getenv("DURABLE_WTIMEOUT_MS", "5000"))
+
+# Named write acknowledgement levels for log ingestion
+WRITE_PROFILES = {
+    # Acknowledged by the primary once applied in memory, no journal wait
+    "fast": WriteConcern(w=1, j=False),
+    # Acknowledged once a majority has journaled it; survives a failover
+    "durable": WriteConcern(w="majority", j=True, wtimeout=DURABLE_WTIMEOUT_MS),
+    # Unacknowledged: lowest latency, but failed writes go unnoticed and
+    # skip the journal fallback. Meant for lab and test readers.
+    "fire-and-forget": WriteConcern(w=0),
+}
+
+
+def check_profile(name):
+    """Returns `name` if it is a known profile or None (the client default)."""
+    if name is not None and name not in WRITE_PROFILES:
+        raise ValueError(f"Unknown write profile {name!r}, expected one of {', '.join(WRITE_PROFILES)}")
+    return name
+
+
+def parse_reader_profiles(text):
+    """Parses a JSON object mapping reader ids to profile names, e.g. {"lab-1": "fire-and-forget"}."""
+    if not text:
+        return {}
+    mapping = json.loads(text)
+    if not isinstance(mapping, dict):
+        raise ValueError("Reader write profiles must be a JSON object")
+    for name in mapping.values():
+        check_profile(name)
+    return mapping
+
+
+def with_profile(target, name):
+    """Returns the collection or database `target` using profile `name`'s write concern."""
+    return target if name is None else target.with_options(write_concern=WRITE_PROFILES[name])
+
+
+def group_by_profile(entries, default, by_reader):
+    """Splits log entries into {profile name: entries} using their reader."""
+    groups = {}
+    for entry in entries:
+        groups.setdefault(by_reader.get(entry.get("reader"), default), []).append(entry)
+    return groups